@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from vector_index import normalize_rows
+
+ANSWER_CACHE_SIZE = 2048  # Answers kept across all scopes
+ANSWER_CACHE_TTL = 6 * 60 * 60  # Seconds before a cached answer goes stale
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Min cosine similarity for a hit
+
+
+def writing_script(text: str) -> str:
+    """Dominant Unicode script of the text (LATIN, THAI, CJK, ...), a cheap language bucket"""
+    scripts = Counter(unicodedata.name(char, "UNKNOWN").split(" ")[0] for char in text if char.isalpha())
+    return scripts.most_common(1)[0][0] if scripts else "UNKNOWN"
+
+
+class CachedAnswer:
+    def __init__(self, scope: str, embedding: np.ndarray, answer: str, latency: float, expires_at: float):
+        self.scope = scope
+        self.embedding = embedding
+        self.answer = answer
+        self.latency = latency  # Seconds the original LLM call took
+        self.expires_at = expires_at
+
+
+class ScopeMatrix:
+    """One scope's embeddings as rows of a growable matrix, updated in place.
+
+    Rows are appended into spare capacity (doubled when full) and removed by
+    moving the last row into the gap, so neither costs a rebuild.
+    """
+
+    def __init__(self, dim: int, dtype):
+        self.ids = []  # entry id of each row
+        self._rows = np.empty((16, dim), dtype=dtype)
+        self._positions = {}  # entry id -> row
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._rows[:len(self.ids)]
+
+    def add(self, entry_id: int, embedding: np.ndarray):
+        if len(self.ids) == len(self._rows):
+            grown = np.empty((2 * len(self._rows), self._rows.shape[1]), dtype=self._rows.dtype)
+            grown[:len(self.ids)] = self._rows
+            self._rows = grown
+        self._rows[len(self.ids)] = embedding
+        self._positions[entry_id] = len(self.ids)
+        self.ids.append(entry_id)
+
+    def remove(self, entry_id: int):
+        position = self._positions.pop(entry_id)
+        last_id = self.ids.pop()
+        if last_id != entry_id:
+            self._rows[position] = self._rows[len(self.ids)]
+            self.ids[position] = last_id
+            self._positions[last_id] = position
+
+
+class SemanticAnswerCache:
+    """Serves a stored LLM answer when a new query is close enough to an earlier one.
+
+    Entries are scoped (e.g. by tone and writing script) so an answer is only
+    reused for queries that would be answered the same way. A lookup is one
+    matrix-vector product over the scope's embeddings. Eviction is LRU by size,
+    plus a TTL.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_size: int = ANSWER_CACHE_SIZE,
+                 ttl: float = ANSWER_CACHE_TTL):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # entry id -> CachedAnswer, least recently used first
+        self._scopes = {}  # scope -> ScopeMatrix of its entries
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.latency_saved = 0.0
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        scope = self._scopes[entry.scope]
+        scope.remove(entry_id)
+        if not scope.ids:
+            del self._scopes[entry.scope]
+
+    def lookup(self, embedding: np.ndarray, scope: str = ""):
+        """Return a cached answer for a near-duplicate query in the same scope, or None"""
+        query = normalize_rows(embedding).reshape(-1)
+        with self._lock:
+            if scope in self._scopes:
+                similarities = self._scopes[scope].matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id = self._scopes[scope].ids[best]
+                    entry = self._entries[entry_id]
+                    if entry.expires_at > time.monotonic():
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        self.latency_saved += entry.latency
+                        return entry.answer
+                    self._remove(entry_id)
+                    self.expirations += 1
+            self.misses += 1
+            return None
+
+    def store(self, embedding: np.ndarray, answer: str, latency: float, scope: str = ""):
+        entry = CachedAnswer(scope, normalize_rows(embedding).reshape(-1), answer, latency,
+                             time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[self._next_id] = entry
+            if scope not in self._scopes:
+                self._scopes[scope] = ScopeMatrix(len(entry.embedding), entry.embedding.dtype)
+            self._scopes[scope].add(self._next_id, entry.embedding)
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "threshold": self.threshold,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved_seconds": self.latency_saved,
+            "avg_latency_saved_seconds": self.latency_saved / self.hits if self.hits else 0.0
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
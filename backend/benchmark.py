@@ -0,0 +1,400 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+# Load test for the backend: python benchmark.py --concurrency 16 --requests 200 --output bench.json
+#
+# Each scenario boots a fresh server process with deterministic local stand-ins
+# for Gemini, the sentence-transformer and StableDiffusionPipeline, drives one
+# endpoint at a fixed concurrency and reports latency percentiles, throughput
+# and the server's peak RSS as JSON, so runs can be compared between commits.
+
+SCENARIOS = ["query", "upload_csv", "api_chat", "menu_items", "customer_service", "sd_generate"]
+STAND_IN_DIMENSION = 384  # Same as all-MiniLM-L6-v2, so the vector_db indexes still load
+SERVER_BOOT_TIMEOUT = 120  # Seconds to wait for a server process to answer
+JOB_POLL_INTERVAL = 0.05  # Seconds between ingest job status checks
+
+# Exact QA questions take the direct path, padded ones reach the LLM (and defeat the
+# answer cache), unrelated ones are escalated
+CHAT_QUESTIONS = [
+    "What are my best-selling items?",
+    "What are my best-selling items this week for branch {i}?",
+    "How can I reduce delivery time for order batch {i}?",
+    "Is it going to rain in Paris on day {i}?",
+]
+TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360f8cf000000030101005c2d8d5c0000000049454e44ae426082"
+)
+
+
+# --- Stand-ins, installed in the server process only ---
+
+def stand_in_embedding(text: str) -> np.ndarray:
+    """Bag-of-words hash embedding: deterministic, and similar texts get similar vectors"""
+    vector = np.zeros(STAND_IN_DIMENSION, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        seed = int(hashlib.md5(word.encode()).hexdigest()[:8], 16)
+        vector += np.random.default_rng(seed).standard_normal(STAND_IN_DIMENSION).astype(np.float32)
+    return vector
+
+
+def install_stand_ins(llm_latency: float, embed_latency: float, sd_latency: float):
+    """Register fake google.generativeai, sentence_transformers and diffusers modules"""
+
+    class StandInResponse:
+        def __init__(self, text):
+            self.text = text
+
+    class StandInStream:
+        def __init__(self, pieces, delay):
+            self.pieces = pieces
+            self.delay = delay
+
+        def __iter__(self):
+            for piece in self.pieces:
+                time.sleep(self.delay)
+                yield StandInResponse(piece)
+
+        async def __aiter__(self):
+            for piece in self.pieces:
+                await asyncio.sleep(self.delay)
+                yield StandInResponse(piece)
+
+    class GenerativeModel:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def answer(self, prompt):
+            digest = hashlib.md5(prompt.encode()).hexdigest()[:8]
+            return f"{{'text': 'Stand-in answer {digest}', 'image': '/tmp/top_5_best_selling_items.png'}}"
+
+        def generate_content(self, prompt, stream=False):
+            if stream:
+                return StandInStream(self.pieces(prompt), llm_latency / 8)
+            time.sleep(llm_latency)
+            return StandInResponse(self.answer(prompt))
+
+        async def generate_content_async(self, prompt, stream=False):
+            if stream:
+                return StandInStream(self.pieces(prompt), llm_latency / 8)
+            await asyncio.sleep(llm_latency)
+            return StandInResponse(self.answer(prompt))
+
+        def pieces(self, prompt):
+            text = self.answer(prompt)
+            size = -(-len(text) // 8)
+            return [text[i:i + size] for i in range(0, len(text), size)]
+
+    class SentenceTransformer:
+        def __init__(self, model_name, device=None):
+            self.model_name = model_name
+
+        def encode(self, texts, **kwargs):
+            time.sleep(embed_latency)
+            if isinstance(texts, str):
+                return stand_in_embedding(texts)
+            return np.vstack([stand_in_embedding(text) for text in texts])
+
+    class StandInImage:
+        def save(self, buffer, format="PNG"):
+            buffer.write(TINY_PNG)
+
+    class StandInPipelineOutput:
+        def __init__(self):
+            self.images = [StandInImage()]
+
+    class StableDiffusionPipeline:
+        @classmethod
+        def from_pretrained(cls, model_id, **kwargs):
+            return cls()
+
+        def to(self, device):
+            return self
+
+        def __call__(self, prompt, **kwargs):
+            time.sleep(sd_latency)
+            return StandInPipelineOutput()
+
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = GenerativeModel
+    google = sys.modules.setdefault("google", types.ModuleType("google"))
+    google.generativeai = genai
+    sys.modules["google.generativeai"] = genai
+
+    sentence_transformers = types.ModuleType("sentence_transformers")
+    sentence_transformers.SentenceTransformer = SentenceTransformer
+    sys.modules["sentence_transformers"] = sentence_transformers
+
+    diffusers = types.ModuleType("diffusers")
+    diffusers.StableDiffusionPipeline = StableDiffusionPipeline
+    sys.modules["diffusers"] = diffusers
+
+
+class LatencyInjectedModel:
+    """Wraps main's mock causal LM so each generate() costs the stand-in LLM latency"""
+
+    def __init__(self, model, latency: float):
+        self.model = model
+        self.latency = latency
+
+    def generate(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return self.model.generate(*args, **kwargs)
+
+
+def serve(args):
+    """Run main.app (with the Stable Diffusion app under /sd) against the stand-ins"""
+    install_stand_ins(args.llm_latency_ms / 1000, args.embed_latency_ms / 1000, args.sd_latency_ms / 1000)
+    import uvicorn
+    import main
+    import rag_pipeline
+    import stable_diffusion_api
+    from qa_index import QAIndex
+
+    # main runs its zero-latency TESTING mocks; give them the configured model costs too
+    main.embedding_model = sys.modules["sentence_transformers"].SentenceTransformer(main.EMBEDDING_MODEL)
+    if not main.MICRO_BATCHING:
+        main.query_encoder = main.embedding_model
+    main.model = LatencyInjectedModel(main.model, args.llm_latency_ms / 1000)
+
+    # Keep stand-in artifacts away from the real document store and vector_db
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    main.DOCUMENT_STORE_DIR = os.path.join(workdir, "document_store")
+    main.document_store = main.DocumentStore()
+    rag_pipeline.qa_index = QAIndex(index_dir=workdir)
+    main.app.mount("/sd", stable_diffusion_api.app)
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- Load driver ---
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int):
+    """High-water mark of a process's resident memory (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_csv(rows: int) -> bytes:
+    lines = ["id,name,description,category"]
+    lines += [f"{i},Item {i},Steamed dumpling number {i} with prawn filling,{i % 7}" for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def chat_question(i: int) -> str:
+    return CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)].format(i=i)
+
+
+async def call_query(client, i, args):
+    response = await client.post("/query", json={"question": chat_question(i)})
+    response.raise_for_status()
+
+
+async def call_upload_csv(client, i, args):
+    """End to end: upload, then wait for the background ingest job to finish"""
+    response = await client.post(
+        "/upload_csv", params={"text_columns": "name,description", "metadata_columns": "category"},
+        files={"file": ("bench.csv", args.csv_bytes, "text/csv")})
+    response.raise_for_status()
+    job_url = response.json()["job_url"]
+    while True:
+        job = (await client.get(job_url)).json()
+        if job["status"] == "completed":
+            return
+        if job["status"] == "failed":
+            raise RuntimeError(job["error"])
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+async def call_api_chat(client, i, args):
+    response = await client.post("/api/chat", json={"query": chat_question(i), "chat_id": f"bench-{i % 50}"})
+    response.raise_for_status()
+
+
+async def call_menu_items(client, i, args):
+    response = await client.get("/menu/items")
+    response.raise_for_status()
+
+
+async def call_customer_service(client, i, args):
+    response = await client.post("/customer-service/send-payload", json={
+        "chatId": i % 50,
+        "latestCustomerMessage": chat_question(i),
+        "settings": {"tone": "friendly"}
+    })
+    response.raise_for_status()
+
+
+async def call_sd_generate(client, i, args):
+    response = await client.post("/sd/chatbot-generate", json={"prompt": f"Har gow platter {i}", "steps": 20})
+    response.raise_for_status()
+
+
+SCENARIO_CALLS = {
+    "query": call_query,
+    "upload_csv": call_upload_csv,
+    "api_chat": call_api_chat,
+    "menu_items": call_menu_items,
+    "customer_service": call_customer_service,
+    "sd_generate": call_sd_generate,
+}
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else (None,) * 3
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "mean": float(latencies_ms.mean()) if len(latencies_ms) else None,
+            "max": float(latencies_ms.max()) if len(latencies_ms) else None
+        }
+    }
+
+
+async def drive(base_url: str, call, args) -> dict:
+    import httpx
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for i in range(args.warmup):
+            await call(client, -1 - i, args)
+
+        latencies, errors = [], 0
+        indices = iter(range(args.requests))
+
+        async def worker():
+            nonlocal errors
+            for i in indices:
+                started = time.perf_counter()
+                try:
+                    await call(client, i, args)
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def wait_until_ready(server: subprocess.Popen, base_url: str):
+    import httpx
+    deadline = time.monotonic() + SERVER_BOOT_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if httpx.get(base_url + "/document_count", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def run_scenario(name: str, args) -> dict:
+    """Boot a fresh server so caches start cold and peak RSS belongs to this scenario"""
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+               "--llm-latency-ms", str(args.llm_latency_ms), "--embed-latency-ms", str(args.embed_latency_ms),
+               "--sd-latency-ms", str(args.sd_latency_ms)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(server, base_url)
+        result = asyncio.run(drive(base_url, SCENARIO_CALLS[name], args))
+        result["peak_rss_mb"] = peak_rss_mb(server.pid)
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend with local model stand-ins")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests sent first")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--csv-rows", type=int, default=500, help="Rows in each uploaded CSV")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Stand-in Gemini latency")
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0, help="Stand-in embedding latency per call")
+    parser.add_argument("--sd-latency-ms", type=float, default=1000.0, help="Stand-in Stable Diffusion latency")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8000, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    args.csv_bytes = make_csv(args.csv_rows)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("csv_bytes", "serve", "port")},
+        "scenarios": {}
+    }
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        report["scenarios"][name] = run_scenario(name, args)
+
+    output = json.dumps(report, indent=2, default=float)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
+import os
+import sqlite3
+import threading
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from uuid import uuid4
 
+CHAT_DB_PATH = "data/chats.db"
+CHAT_PAGE_SIZE = 50  # Chats or messages returned per page by default
+MAX_CHAT_PAGE_SIZE = 200
+
 
 # ID should be UUID v4
 # timestamps are Unix timestamp
@@ -20,30 +27,118 @@ class Message(BaseModel):
     text: str
     sender: str
     timestamp: int
-    image_url: str = None
+    image_url: Optional[str] = None
 
 
-class ChatDatabase(BaseModel):
-    messages: dict[str, List[Message]]
-    chats: List[Chat]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    preview TEXT NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chats_timestamp ON chats (timestamp);
 
-    def add_message(self, message: Message, chat_id: str):
-        if chat_id in self.messages:
-            self.messages[chat_id].append(message)
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    chat_id TEXT NOT NULL REFERENCES chats (id),
+    text TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    image_url TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_chat_timestamp ON messages (chat_id, timestamp);
+"""
+
+
+class ChatDatabase:
+    """Chats and messages in an embedded SQLite database (WAL mode).
+
+    Writes go through one shared connection, one at a time. Each reading thread
+    has its own connection, so reads run concurrently with each other and with
+    a committing write instead of queueing behind the write lock.
 
-            # Update the chat preview with the latest message
-            for chat in self.chats:
-                if chat.id == chat_id:
-                    chat.preview = message.text[:50] + ("..." if len(message.text) > 50 else "")
-                    chat.timestamp = message.timestamp
-                    break
+    Reads are keyset-paginated: `before` is the id of the oldest chat or message
+    the client already has, and rows come back through the (timestamp, rowid)
+    indexes, so a page costs the same however long the history is. Rows sharing
+    a timestamp are ordered by insertion.
+    """
 
-    def get_all_messages(self, chat_id: str) -> List[Message]:
-        return self.messages[chat_id]
+    def __init__(self, path: str = CHAT_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._local = threading.local()  # This thread's read connection
+        self._readers = []  # Every read connection, closed by close()
+        with self._lock, self._conn:
+            # WAL lets reads proceed while a write is committing
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
 
-    def get_all_chats(self) -> List[Chat]:
-        return self.chats
+    def add_message(self, message: Message, chat_id: str):
+        preview = message.text[:50] + ("..." if len(message.text) > 50 else "")
+        with self._lock, self._conn:
+            # Update the chat preview with the latest message; unknown chats are ignored
+            updated = self._conn.execute(
+                "UPDATE chats SET preview = ?, timestamp = ? WHERE id = ?",
+                (preview, message.timestamp, chat_id)).rowcount
+            if updated:
+                self._conn.execute(
+                    "INSERT INTO messages (id, chat_id, text, sender, timestamp, image_url) VALUES (?, ?, ?, ?, ?, ?)",
+                    (message.id, chat_id, message.text, message.sender, message.timestamp, message.image_url))
+
+    def get_all_messages(self, chat_id: str, before: Optional[str] = None,
+                         limit: int = CHAT_PAGE_SIZE) -> List[Message]:
+        """Latest `limit` messages of a chat older than message `before`, oldest first"""
+        query = "SELECT id, text, sender, timestamp, image_url FROM messages WHERE chat_id = ?"
+        params = [chat_id]
+        if before is not None:
+            query += (" AND (timestamp, rowid) <"
+                      " (SELECT timestamp, rowid FROM messages WHERE id = ? AND chat_id = ?)")
+            params += [before, chat_id]
+        query += " ORDER BY timestamp DESC, rowid DESC LIMIT ?"
+        rows = self._read(query, params + [limit])
+        return [Message(**row) for row in reversed(rows)]
+
+    def get_all_chats(self, before: Optional[str] = None, limit: int = CHAT_PAGE_SIZE) -> List[Chat]:
+        """Most recently active `limit` chats after chat `before` in that order"""
+        query = "SELECT id, title, preview, timestamp FROM chats"
+        params = []
+        if before is not None:
+            query += " WHERE (timestamp, rowid) < (SELECT timestamp, rowid FROM chats WHERE id = ?)"
+            params.append(before)
+        query += " ORDER BY timestamp DESC, rowid DESC LIMIT ?"
+        rows = self._read(query, params + [limit])
+        return [Chat(**row) for row in rows]
 
     def add_new_chat(self, chat: Chat):
-        self.chats.append(chat)
-        self.messages[chat.id] = []
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO chats (id, title, preview, timestamp) VALUES (?, ?, ?, ?) ON CONFLICT (id) DO UPDATE"
+                " SET title = excluded.title, preview = excluded.preview, timestamp = excluded.timestamp",
+                (chat.id, chat.title, chat.preview, chat.timestamp))
+
+    def _read(self, query: str, params: list) -> List[sqlite3.Row]:
+        if self.path == ":memory:":
+            # Each connection would open its own empty in-memory database
+            with self._lock:
+                return self._conn.execute(query, params).fetchall()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        return conn.execute(query, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+            self._conn.close()
@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict, deque
+
+HISTORY_TOKEN_BUDGET = 1024  # Tokens of verbatim turns kept per chat
+SUMMARY_TOKEN_BUDGET = 256  # Tokens of rolling summary kept per chat
+MAX_TRACKED_CHATS = 1000  # Least recently used chats are forgotten past this
+
+
+def count_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting"""
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Keep the most recent part of `text` that fits the budget"""
+    max_chars = budget * 4
+    return text if len(text) <= max_chars else text[-max_chars:]
+
+
+class ChatHistory:
+    """Recent turns of one chat within a token budget, plus a summary of older ones"""
+
+    def __init__(self):
+        self.turns = deque()  # (question, answer, tokens)
+        self.tokens = 0
+        self.summary = ""
+
+    def render(self) -> str:
+        lines = [f"Summary of earlier conversation: {self.summary}"] if self.summary else []
+        lines.extend(f"User: {q}\nAssistant: {a}" for q, a, _ in self.turns)
+        return "\n".join(lines)
+
+
+class ConversationMemory:
+    """Per-chat conversation history with a sliding token budget.
+
+    When a chat exceeds `token_budget`, its oldest turns are evicted. If a
+    `summarizer(summary, evicted_turns) -> summary` is given, evicted turns are
+    folded into a rolling summary instead of being dropped, so the history part
+    of a prompt stays roughly constant in size however long the chat runs.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, summary_budget: int = SUMMARY_TOKEN_BUDGET,
+                 max_chats: int = MAX_TRACKED_CHATS, summarizer=None):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_chats = max_chats
+        self.summarizer = summarizer
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, chat_id: str) -> ChatHistory:
+        history = self._chats.get(chat_id)
+        if history is None:
+            history = self._chats[chat_id] = ChatHistory()
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        self._chats.move_to_end(chat_id)
+        return history
+
+    def render(self, chat_id: str) -> str:
+        with self._lock:
+            return self._get(chat_id).render()
+
+    def add_turn(self, chat_id: str, question: str, answer: str):
+        with self._lock:
+            history = self._get(chat_id)
+            tokens = count_tokens(question) + count_tokens(answer)
+            history.turns.append((question, answer, tokens))
+            history.tokens += tokens
+
+            evicted = []
+            while history.tokens > self.token_budget and history.turns:
+                turn = history.turns.popleft()
+                history.tokens -= turn[2]
+                evicted.append(turn[:2])
+            summary = history.summary
+
+        if evicted and self.summarizer is not None:
+            # Summarize outside the lock; it may call an LLM
+            summary = truncate_to_tokens(self.summarizer(summary, evicted), self.summary_budget)
+            with self._lock:
+                history.summary = summary
+
+    def clear(self, chat_id: str):
+        with self._lock:
+            self._chats.pop(chat_id, None)
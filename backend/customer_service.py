@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from datetime import datetime
-from rag_pipeline import query_rag
+from rag_pipeline import query_rag_async
 
 router = APIRouter(prefix="/customer-service")
 
@@ -214,7 +214,8 @@ async def send_payload(payload: dict):
     latest_customer_message = payload.get("latestCustomerMessage")
     ai_tone = payload["settings"]["tone"]
 
-    ai_response = query_rag(latest_customer_message + f"\nPlease respond in a {ai_tone} tone.")
+    ai_response = await query_rag_async(latest_customer_message, chat_id=f"customer-service:{payload['chatId']}",
+                                        tone=ai_tone)
 
     now_utc = datetime.utcnow().isoformat() + "Z"  # Get current UTC time in ISO 8601 format
 
@@ -1,51 +1,235 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import pandas as pd
 from datetime import datetime
+from transaction_store import TransactionStore
 
-def generate_all_monthly_leaderboards(transaction_file, merchant_file):
-    # Load data
-    transactions = pd.read_csv(transaction_file)
-    merchants = pd.read_csv(merchant_file)
-    
-    # Convert and extract month
-    transactions['order_time'] = pd.to_datetime(transactions['order_time'], dayfirst=True, errors='coerce')
-    transactions = transactions.dropna(subset=['order_time'])
-    transactions['month'] = transactions['order_time'].dt.to_period('M')
-    
-    # Get all unique months sorted
-    all_months = sorted(transactions['month'].unique(), reverse=True)
-    
-    for month_period in all_months:
-        # Filter for current month
-        month_trans = transactions[transactions['month'] == month_period]
-        
-        # Calculate metrics
-        monthly_sales = month_trans.groupby('merchant_id').agg(
-            total_sales=('order_value', 'sum'),
-            order_count=('order_id', 'count')
-        ).reset_index()
-        
-        # Merge with merchant data
-        leaderboard = pd.merge(
-            monthly_sales,
-            merchants[['merchant_id', 'merchant_name', 'city_id']],
-            on='merchant_id',
-            how='left'
-        )
-        
+LEADERBOARD_DIR = "data/Leaderboard data"
+FINGERPRINTS_FILE = ".fingerprints.json"  # Per-month input fingerprints of the written leaderboards
+LEADERBOARD_FORMAT = 1  # Bump when the leaderboard layout changes to force a rebuild
+TRANSACTION_COLUMNS = ['merchant_id', 'order_id', 'order_time', 'order_value']
+STREAM_CHUNK_SIZE = 1_000_000  # Transaction rows per chunk in streaming mode
+STREAM_WORKERS = os.cpu_count() or 1
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def month_row_hashes(transactions):
+    """Per month, the row count and the (wrapping) sum of row hashes.
+
+    Rows are hashed in one normalized form (string ids, order_time as int64
+    nanoseconds, float order_value), so the typed store and the raw CSV chunks
+    of streaming mode fingerprint the same rows identically.
+    """
+    rows = pd.DataFrame({
+        'merchant_id': transactions['merchant_id'].astype('string'),
+        'order_id': transactions['order_id'].astype('string'),
+        'order_time': transactions['order_time'].astype('datetime64[ns]').astype('int64'),
+        'order_value': transactions['order_value'].astype('float64'),
+    })
+    row_hashes = pd.util.hash_pandas_object(rows, index=False)
+    grouped = row_hashes.groupby(transactions['month'], observed=True)
+    # uint64 sums wrap around, which keeps them a valid multiset hash
+    sums, counts = grouped.sum(), grouped.size()
+    return {str(month): (int(counts[month]), int(sums[month])) for month in sums.index}
+
+
+def month_fingerprints(row_hashes, merchants_digest):
+    """Order-independent fingerprint of each month's input rows (plus the merchant file)"""
+    return {
+        month: f"{LEADERBOARD_FORMAT}:{merchants_digest}:{count}:{total:016x}"
+        for month, (count, total) in row_hashes.items()
+    }
+
+
+def load_fingerprints(output_dir):
+    try:
+        with open(os.path.join(output_dir, FINGERPRINTS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_fingerprints(output_dir, fingerprints):
+    path = os.path.join(output_dir, FINGERPRINTS_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(fingerprints, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def leaderboard_path(output_dir, month):
+    return os.path.join(output_dir, f"monthly_leaderboard_{month}.csv")
+
+
+def changed_months(output_dir, fingerprints, current, force=False):
+    """Months whose input changed (or whose file is missing), newest first"""
+    return [
+        month for month in sorted(current, reverse=True)
+        if force or fingerprints.get(month) != current[month]
+        or not os.path.exists(leaderboard_path(output_dir, month))
+    ]
+
+
+def write_leaderboards(monthly_sales, merchants, output_dir, fingerprints, current):
+    """Rank and write each month of `monthly_sales` (month, merchant_id, total_sales, order_count)"""
+    # Merge with merchant data
+    monthly_sales = pd.merge(
+        monthly_sales,
+        merchants[['merchant_id', 'merchant_name', 'city_id']],
+        on='merchant_id',
+        how='left'
+    )
+
+    by_month = monthly_sales.groupby('month', observed=True)
+    for month, leaderboard in sorted(by_month, key=lambda group: group[0], reverse=True):
         # Add ranking and month info
-        leaderboard = leaderboard.sort_values('total_sales', ascending=False)
+        leaderboard = leaderboard.drop(columns='month').sort_values('total_sales', ascending=False)
         leaderboard['rank'] = leaderboard['total_sales'].rank(ascending=False, method='min').astype(int)
-        month_str = month_period.strftime('%B %Y')
+        month_str = datetime.strptime(month, '%Y-%m').strftime('%B %Y')
         leaderboard.insert(0, 'month', month_str)  # Add month as first column
-        
+
         # Save to CSV
-        filename = f"monthly_leaderboard_{month_period.strftime('%Y-%m')}.csv"
-        leaderboard.to_csv(filename, index=False)
-        
+        leaderboard.to_csv(leaderboard_path(output_dir, month), index=False)
+        fingerprints[month] = current[month]
+
         print(f"Generated leaderboard for {month_str} ({len(leaderboard)} merchants)")
 
-    print(f"\nCompleted! Generated {len(all_months)} monthly leaderboards.")
+    save_fingerprints(output_dir, fingerprints)
+
+
+def generate_all_monthly_leaderboards(transaction_file, merchant_file, output_dir=LEADERBOARD_DIR,
+                                      since=None, force=False):
+    """Write one leaderboard CSV per month, skipping months whose input is unchanged.
+
+    All months are aggregated in a single groupby and merged with the merchants
+    once. `since` ("YYYY-MM") limits the run to that month and later ones.
+    """
+    # Load only the needed columns from the typed store (order_time already parsed, day first)
+    store = TransactionStore(transaction_file, datetime_format=None, dayfirst=True)
+    months = [month for month in store.months() if since is None or month >= since]
+    if not months:
+        print("No transactions in the requested months.")
+        return
+    transactions = store.read(columns=TRANSACTION_COLUMNS + ['month'], months=months)
+    transactions = transactions.dropna(subset=['order_time'])
+    # Rank ties keep merchant id order, as with per-month groupbys
+    merchant_ids = transactions['merchant_id'].cat
+    transactions['merchant_id'] = merchant_ids.reorder_categories(sorted(merchant_ids.categories))
+    merchants = pd.read_csv(merchant_file)
+
+    # Only months whose input changed (or whose file is missing) are rebuilt
+    os.makedirs(output_dir, exist_ok=True)
+    fingerprints = load_fingerprints(output_dir)
+    current = month_fingerprints(month_row_hashes(transactions), file_digest(merchant_file))
+    changed = changed_months(output_dir, fingerprints, current, force)
+
+    # Calculate metrics for every changed month in one pass
+    transactions = transactions[transactions['month'].isin(changed)]
+    monthly_sales = transactions.groupby(['month', 'merchant_id'], observed=True).agg(
+        total_sales=('order_value', 'sum'),
+        order_count=('order_id', 'count')
+    ).reset_index()
+
+    write_leaderboards(monthly_sales, merchants, output_dir, fingerprints, current)
+    print(f"\nCompleted! Generated {len(changed)} monthly leaderboards, "
+          f"{len(current) - len(changed)} unchanged.")
+
+
+def aggregate_chunk(chunk, datetime_format, since=None):
+    """Partial (month, merchant_id) sums and counts, plus per-month row hashes, of one chunk"""
+    chunk['order_time'] = pd.to_datetime(chunk['order_time'], format=datetime_format, errors='coerce')
+    chunk['month'] = chunk['order_time'].dt.strftime('%Y-%m')
+    chunk = chunk.dropna(subset=['month'])
+    if since is not None:
+        chunk = chunk[chunk['month'] >= since]
+    sales = chunk.groupby(['month', 'merchant_id']).agg(
+        total_sales=('order_value', 'sum'),
+        order_count=('order_id', 'count')
+    )
+    return sales, month_row_hashes(chunk)
+
+
+def generate_monthly_leaderboards_streaming(transaction_file, merchant_file, datetime_format,
+                                            output_dir=LEADERBOARD_DIR, since=None, force=False,
+                                            chunk_size=STREAM_CHUNK_SIZE, workers=STREAM_WORKERS):
+    """Out-of-core variant of generate_all_monthly_leaderboards for very large files.
+
+    The CSV is read `chunk_size` rows at a time and each chunk is aggregated in
+    a worker process, parsing order_time with the explicit `datetime_format`.
+    The partial sums are folded into a running (month, merchant_id) accumulator,
+    and at most two chunks per worker are in flight, so peak memory depends on
+    the chunk size and worker count, not on the file size.
+    """
+    sales = None
+    row_hashes = {}
+
+    def fold(future):
+        nonlocal sales
+        partial_sales, partial_hashes = future.result()
+        sales = partial_sales if sales is None else sales.add(partial_sales, fill_value=0)
+        for month, (count, total) in partial_hashes.items():
+            previous_count, previous_total = row_hashes.get(month, (0, 0))
+            row_hashes[month] = (previous_count + count, (previous_total + total) % 2**64)
+
+    chunks = pd.read_csv(transaction_file, usecols=TRANSACTION_COLUMNS, chunksize=chunk_size,
+                         dtype={'merchant_id': str, 'order_id': str, 'order_time': str})
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    fold(future)
+            pending.add(pool.submit(aggregate_chunk, chunk[TRANSACTION_COLUMNS], datetime_format, since))
+        for future in pending:
+            fold(future)
+
+    if sales is None or sales.empty:
+        print("No transactions in the requested months.")
+        return
+    merchants = pd.read_csv(merchant_file)
+
+    # Only months whose input changed (or whose file is missing) are rebuilt
+    os.makedirs(output_dir, exist_ok=True)
+    fingerprints = load_fingerprints(output_dir)
+    current = month_fingerprints(row_hashes, file_digest(merchant_file))
+    changed = changed_months(output_dir, fingerprints, current, force)
+
+    monthly_sales = sales.sort_index().reset_index()
+    monthly_sales = monthly_sales[monthly_sales['month'].isin(changed)]
+    monthly_sales['order_count'] = monthly_sales['order_count'].astype(int)
+
+    write_leaderboards(monthly_sales, merchants, output_dir, fingerprints, current)
+    print(f"\nCompleted! Generated {len(changed)} monthly leaderboards, "
+          f"{len(current) - len(changed)} unchanged.")
 
 # Run the function
 if __name__ == "__main__":
-    generate_all_monthly_leaderboards('data/transaction_data.csv', 'data/merchant.csv')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate monthly merchant sales leaderboards")
+    parser.add_argument("--transactions", default="data/transaction_data.csv")
+    parser.add_argument("--merchants", default="data/merchant.csv")
+    parser.add_argument("--output-dir", default=LEADERBOARD_DIR)
+    parser.add_argument("--since", help="Only consider this month and later ones (YYYY-MM), e.g. for the nightly job")
+    parser.add_argument("--force", action="store_true", help="Rebuild every month even if its input is unchanged")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Aggregate the CSV in chunks across processes instead of loading it whole")
+    parser.add_argument("--datetime-format", help="order_time format for --streaming, e.g. '%%d/%%m/%%Y %%H:%%M'")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=STREAM_WORKERS)
+    args = parser.parse_args()
+    if args.streaming:
+        if not args.datetime_format:
+            parser.error("--streaming needs an explicit --datetime-format")
+        generate_monthly_leaderboards_streaming(args.transactions, args.merchants, args.datetime_format,
+                                                args.output_dir, since=args.since, force=args.force,
+                                                chunk_size=args.chunk_size, workers=args.workers)
+    else:
+        generate_all_monthly_leaderboards(args.transactions, args.merchants, args.output_dir,
+                                          since=args.since, force=args.force)
@@ -0,0 +1,88 @@
+import glob
+import os
+import threading
+
+import faiss
+import numpy as np
+
+from qa_index import VECTOR_DB_DIR
+from vector_index import normalize_rows
+
+INDEX_SUFFIX = "_faiss.index"
+RESPONSES_SUFFIX = "_responses.npy"
+MAX_DOMAINS = 2  # Domain indexes searched per query
+DOMAIN_MARGIN = 0.1  # Also search a runner-up domain whose centroid is this close to the best
+DOMAIN_MIN_SCORE = 0.35  # Cosine similarity below which a domain answer is treated as noise
+
+
+class DomainIndex:
+    """One prebuilt vector_db domain: a FAISS inner-product index and its responses"""
+
+    def __init__(self, name: str, index, responses):
+        self.name = name
+        self.index = index
+        self.responses = responses
+        # Mean of the domain's (unit) vectors, used to route queries
+        vectors = index.reconstruct_n(0, index.ntotal)
+        self.centroid = normalize_rows(vectors.mean(axis=0))
+
+
+class DomainRouter:
+    """Routes each query to the closest domain indexes by centroid match.
+
+    Domains are discovered from `<name>_faiss.index` / `<name>_responses.npy`
+    pairs and loaded once. Only the routed indexes are searched, so the per-query
+    cost grows with MAX_DOMAINS rather than with the number of domains.
+    """
+
+    def __init__(self, index_dir: str = VECTOR_DB_DIR, max_domains: int = MAX_DOMAINS,
+                 margin: float = DOMAIN_MARGIN, min_score: float = DOMAIN_MIN_SCORE):
+        self.index_dir = index_dir
+        self.max_domains = max_domains
+        self.margin = margin
+        self.min_score = min_score
+        self.domains = None
+        self._centroids = None
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        if self.domains is not None:
+            return
+        with self._lock:
+            if self.domains is not None:
+                return
+            domains = []
+            for index_path in sorted(glob.glob(os.path.join(self.index_dir, "*" + INDEX_SUFFIX))):
+                name = os.path.basename(index_path)[:-len(INDEX_SUFFIX)]
+                responses_path = os.path.join(self.index_dir, name + RESPONSES_SUFFIX)
+                if not os.path.exists(responses_path):
+                    continue
+                index = faiss.read_index(index_path)
+                if index.ntotal == 0:
+                    continue
+                domains.append(DomainIndex(name, index, np.load(responses_path, allow_pickle=True)))
+            self._centroids = np.vstack([domain.centroid for domain in domains]) if domains else None
+            self.domains = domains
+
+    def route(self, query_embedding: np.ndarray) -> list:
+        """Pick the best-matching domain plus any runner-ups within the margin"""
+        self.ensure_loaded()
+        if not self.domains:
+            return []
+        scores = self._centroids @ normalize_rows(query_embedding).reshape(-1)
+        ranked = np.argsort(-scores)[:self.max_domains]
+        return [self.domains[i] for i in ranked if scores[i] >= scores[ranked[0]] - self.margin]
+
+    def search(self, query_embedding: np.ndarray, k: int = 3) -> list:
+        """Search the routed domains and merge their hits as (score, domain, response)"""
+        query = normalize_rows(query_embedding).reshape(1, -1)
+        hits = []
+        for domain in self.route(query):
+            scores, ids = domain.index.search(query, min(k, domain.index.ntotal))
+            hits.extend(
+                (float(score), domain.name, str(domain.responses[i]))
+                for score, i in zip(scores[0], ids[0])
+                if i >= 0 and score >= self.min_score
+            )
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return hits[:k]
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+QUERY_CACHE_SIZE = 4096  # Query embeddings kept in memory
+QUERY_CACHE_TTL = 60 * 60  # Seconds before a cached embedding is recomputed
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as the cache key"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Bounded LRU cache of normalized query text -> embedding, with a TTL"""
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (namespace, text) -> (expires_at, embedding)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def encode(self, model, text: str, namespace: str = "default") -> np.ndarray:
+        """Embed `text` with `model`, skipping the forward pass for a repeated query.
+
+        `namespace` keeps embeddings from different models apart. The normalized text
+        is what gets encoded, so a cached and a fresh embedding are always identical.
+        """
+        normalized = normalize_query(text)
+        key = (namespace, normalized)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, embedding = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        # Encode outside the lock so one slow forward pass does not block cache hits
+        embedding = np.asarray(model.encode(normalized))
+        embedding.setflags(write=False)  # Shared between callers
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return embedding
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by DocumentStore retrieval and the QA RAG pipeline
+query_embedding_cache = EmbeddingCache()
@@ -0,0 +1,153 @@
+import glob
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+from data import LEADERBOARD_DIR
+
+OVERALL = "overall"  # Pseudo-month of the all-time ranking (latest overall_sales_leaderboard_*.csv)
+LEADERBOARD_TOP = 10  # Entries returned by default
+LEADERBOARD_AROUND = 5  # Entries returned on each side of a merchant by default
+MONTHLY_FILE_PATTERN = re.compile(r"monthly_leaderboard_(\d{4}-\d{2})\.csv$")
+
+
+class LeaderboardEntry(BaseModel):
+    month: str  # "YYYY-MM", or "overall"
+    rank: int
+    merchant_id: str
+    merchant_name: Optional[str] = None
+    city_id: Optional[int] = None
+    total_sales: float
+    order_count: int
+
+
+class LeaderboardTable:
+    """Precomputed leaderboard ranks from `output_dir`, held as one columnar table.
+
+    Rows are sorted by (month, rank, merchant_id), so each month is a contiguous
+    slice: top-N is a slice, a rank is a binary search within it and a
+    merchant's neighbours are the rows next to its position. Positions by
+    (month, merchant_id) and each merchant's monthly rows are indexed at load
+    time. The files are re-read when the directory's mtime changes, which one
+    stat per request checks: data.py ends every run by swapping in its
+    fingerprints file, and new files change it too. Files edited in place need
+    reload().
+    """
+
+    def __init__(self, output_dir: str = LEADERBOARD_DIR):
+        self.output_dir = output_dir
+        self._loaded = None  # (columns, month slices, position by (month, merchant), rows by merchant)
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _files(self) -> Dict[str, str]:
+        files = {}
+        for path in glob.glob(os.path.join(self.output_dir, "monthly_leaderboard_*.csv")):
+            match = MONTHLY_FILE_PATTERN.search(os.path.basename(path))
+            if match:
+                files[match.group(1)] = path
+        # File names carry the build date (YYYYMMDD), so the last one is the newest
+        overall = sorted(glob.glob(os.path.join(self.output_dir, "overall_sales_leaderboard_*.csv")))
+        if overall:
+            files[OVERALL] = overall[-1]
+        return files
+
+    def _directory_mtime(self):
+        try:
+            return os.stat(self.output_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self):
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        # Taken before listing, so a change made while loading triggers another load
+        mtime = self._directory_mtime()
+        files = self._files()
+        frames = [
+            pd.read_csv(path, dtype={"merchant_id": str}).assign(month=month)
+            for month, path in files.items()
+        ]
+        entry_columns = list(LeaderboardEntry.model_fields)
+        if frames:
+            table = pd.concat(frames, ignore_index=True).reindex(columns=entry_columns)
+        else:
+            table = pd.DataFrame(columns=entry_columns)
+        table = table.sort_values(["month", "rank", "merchant_id"], kind="stable", ignore_index=True)
+
+        columns = {column: table[column].to_numpy() for column in entry_columns}
+        months = columns["month"]
+        slices = {}
+        for month in np.unique(months):
+            start, stop = np.searchsorted(months, month, "left"), np.searchsorted(months, month, "right")
+            slices[str(month)] = (int(start), int(stop))
+        positions = {(month, merchant_id): position
+                     for position, (month, merchant_id) in enumerate(zip(months, columns["merchant_id"]))}
+        by_merchant = {}
+        for position, (month, merchant_id) in enumerate(zip(months, columns["merchant_id"])):
+            if month != OVERALL:
+                by_merchant.setdefault(merchant_id, []).append(position)
+
+        self._loaded = (columns, slices, positions, by_merchant)
+        self._mtime = mtime
+
+    def _current(self):
+        mtime = self._directory_mtime()
+        if self._loaded is None or mtime != self._mtime:
+            with self._lock:
+                if self._loaded is None or mtime != self._mtime:
+                    self._load()
+        return self._loaded
+
+    def _entries(self, columns, positions) -> List[LeaderboardEntry]:
+        entries = []
+        for position in positions:
+            row = {column: values[position] for column, values in columns.items()}
+            row = {column: None if pd.isna(value) else value for column, value in row.items()}
+            entries.append(LeaderboardEntry(**row))
+        return entries
+
+    def months(self) -> List[str]:
+        return sorted(self._current()[1])
+
+    def top(self, month: str, n: int = LEADERBOARD_TOP) -> Optional[List[LeaderboardEntry]]:
+        """The first `n` entries of `month`, or None for an unknown month"""
+        columns, slices, _, _ = self._current()
+        if month not in slices:
+            return None
+        start, stop = slices[month]
+        return self._entries(columns, range(start, min(start + n, stop)))
+
+    def at_rank(self, month: str, rank: int) -> Optional[List[LeaderboardEntry]]:
+        """Entries of `month` holding `rank` (several when tied)"""
+        columns, slices, _, _ = self._current()
+        if month not in slices:
+            return None
+        start, stop = slices[month]
+        ranks = columns["rank"][start:stop]
+        first, last = np.searchsorted(ranks, rank, "left"), np.searchsorted(ranks, rank, "right")
+        return self._entries(columns, range(start + first, start + last))
+
+    def around(self, month: str, merchant_id: str,
+               radius: int = LEADERBOARD_AROUND) -> Optional[List[LeaderboardEntry]]:
+        """`merchant_id` and up to `radius` entries above and below it in `month`"""
+        columns, slices, positions, _ = self._current()
+        position = positions.get((month, merchant_id))
+        if position is None:
+            return None
+        start, stop = slices[month]
+        return self._entries(columns, range(max(start, position - radius), min(stop, position + radius + 1)))
+
+    def history(self, merchant_id: str) -> Optional[List[LeaderboardEntry]]:
+        """The merchant's entry in every month it is ranked in, oldest first"""
+        columns, _, _, by_merchant = self._current()
+        if merchant_id not in by_merchant:
+            return None
+        return self._entries(columns, by_merchant[merchant_id])
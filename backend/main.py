@@ -1,25 +1,36 @@
-from fastapi import FastAPI, Request, UploadFile, File, HTTPException, Form, status
+from fastapi import FastAPI, Request, UploadFile, File, HTTPException, Form, Query as QueryParam, status, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Annotated
+from typing import List, Optional, Annotated, Tuple
 # from transformers import AutoTokenizer, AutoModelForCausalLM # Comment out real imports
 # from sentence_transformers import SentenceTransformer # Comment out real imports
 import torch
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
-import io
 import csv
+import re
 from fastapi.middleware.cors import CORSMiddleware
 import time
 import os
+import asyncio
+import shutil
+import tempfile
+import threading
+from uuid import uuid4
 import json
 import logging
 
 import customer_service
-from chat_database import Chat, ChatDatabase, Message
-from rag_pipeline import query_rag  # Import the query_rag function
+from chat_database import CHAT_PAGE_SIZE, MAX_CHAT_PAGE_SIZE, Chat, ChatDatabase, Message
+from rag_pipeline import answer_cache, query_rag_async, query_rag_stream  # Import the async RAG entry points
+from embedding_cache import query_embedding_cache
+from vector_index import FaissIndex, build_index, merge_results, normalize_rows, top_k_exact
+from sse import SSE_HEADERS, SSE_MEDIA_TYPE, AnswerTextStream, sse_event
+from micro_batcher import BatchedEncoder, MicroBatcher
+from menu_catalog import MenuCatalog, MenuItem, etag_matches
+from leaderboard import LEADERBOARD_AROUND, LEADERBOARD_TOP, LeaderboardEntry, LeaderboardTable
 
 logger = logging.getLogger(__name__)
 
@@ -54,7 +65,14 @@ os.makedirs("tmp", exist_ok=True)
 # Serving static files
 app.mount("/tmp", StaticFiles(directory="tmp"), name="tmp")
 
-chat_db = ChatDatabase(chats=[], messages={})
+# Persistent chat history (SQLite file under data/)
+chat_db = ChatDatabase()
+
+# Menu items, read from the CSV once and again only when it changes
+menu_catalog = MenuCatalog()
+
+# Precomputed monthly and overall merchant rankings (see data.py)
+leaderboard_table = LeaderboardTable()
 
 # Configuration
 MODEL_NAME = "meta-llama/Llama-2-7b-chat-hf"  # Keep for reference
@@ -63,15 +81,31 @@ DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 MAX_NEW_TOKENS = 512
 TEMPERATURE = 0.7
 CSV_CHUNK_SIZE = 1000  # Number of rows to process at a time for large CSVs
+UPLOAD_BLOCK_SIZE = 1024 * 1024  # Bytes copied at a time when spooling uploads to disk
+MAX_TRACKED_JOBS = 100  # Finished ingest jobs kept for progress lookups
+VECTOR_INDEX_TYPE = "ivf"  # Approximate index used for large stores: "ivf" or "hnsw"
+VECTOR_INDEX_MIN_ROWS = 50000  # Below this many documents, exact search is fast enough
+VECTOR_INDEX_REBUILD_RATIO = 0.1  # Retrain once this fraction of rows sits outside the index
+TOMBSTONE_COMPACT_RATIO = 0.25  # Compact the store once this fraction of rows is deleted
+DOCUMENT_STORE_DIR = "data/document_store"  # Snapshot of embedded documents reopened on startup
+SNAPSHOT_SEGMENT_RATIO = 0.25  # Rewrite the full snapshot once appended segments hold this fraction of its rows
+SNAPSHOT_MAX_SEGMENTS = 16  # ...or once this many segments have been appended
+GENERATION_BATCH_SIZE = int(os.getenv("GENERATION_BATCH_SIZE", "8"))  # Prompts per padded model.generate
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))  # Queries per embedding forward pass
+MICRO_BATCH_WAIT_MS = float(os.getenv("MICRO_BATCH_WAIT_MS", "10"))  # Max time a request waits for batch-mates
 
 # Load models (mocked for testing)
 TESTING = True
 
 if not TESTING:
     try:
-        from transformers import AutoTokenizer, AutoModelForCausalLM
+        from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer
         from sentence_transformers import SentenceTransformer
+        TokenStreamer = TextIteratorStreamer
         tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        # Decoder-only models pad on the left so every prompt ends where generation starts
+        tokenizer.pad_token = tokenizer.pad_token or tokenizer.eos_token
+        tokenizer.padding_side = "left"
         model = AutoModelForCausalLM.from_pretrained(MODEL_NAME).to(DEVICE)
         embedding_model = SentenceTransformer(EMBEDDING_MODEL, device=DEVICE)
     except Exception as e:
@@ -79,22 +113,52 @@ if not TESTING:
 else:
     print("Running in TESTING mode: Using mock models.")
 
+    class MockEncoding(dict):
+        def __getattr__(self, name):
+            try:
+                return self[name]
+            except KeyError:
+                raise AttributeError(name)
+
+        def to(self, device):
+            return self
+
     class MockTokenizer:
         def __init__(self, model_name):
             self.model_name = model_name
 
-        def __call__(self, prompt, return_tensors="pt"):
-            return {"input_ids": torch.tensor([[1, 2, 3]])}  # Dummy input IDs
+        def __call__(self, prompt, return_tensors="pt", padding=False):
+            rows = len(prompt) if isinstance(prompt, list) else 1
+            return MockEncoding(input_ids=torch.tensor([[1, 2, 3]] * rows),  # Dummy input IDs
+                                attention_mask=torch.tensor([[1, 1, 1]] * rows))
 
         def decode(self, output_ids, skip_special_tokens=True):
             return "Mock Llama Response"
 
+    class MockStreamer:
+        def __init__(self, tokenizer, skip_prompt=True, skip_special_tokens=True):
+            self.tokenizer = tokenizer
+            self.pieces = []
+
+        def put(self, output_ids):
+            self.pieces.extend(re.findall(r"\S+\s*", self.tokenizer.decode(output_ids)))
+
+        def end(self):
+            pass
+
+        def __iter__(self):
+            return iter(self.pieces)
+
     class MockModel:
         def __init__(self, model_name):
             self.model_name = model_name
 
-        def generate(self, input_ids, max_new_tokens, temperature, do_sample):
-            return torch.tensor([[4, 5, 6]])  # Dummy output IDs
+        def generate(self, input_ids, max_new_tokens, temperature, do_sample, attention_mask=None, streamer=None):
+            output_ids = torch.tensor([[4, 5, 6]] * len(input_ids))  # Dummy output IDs
+            if streamer is not None:
+                streamer.put(output_ids[0])
+                streamer.end()
+            return output_ids
 
     class MockEmbeddingModel:
         def __init__(self, model_name, device):
@@ -102,19 +166,51 @@ else:
             self.device = device
 
         def encode(self, text):
-            return np.array([0.1, 0.2, 0.3])  # Dummy embedding
+            if isinstance(text, str):
+                return np.array([0.1, 0.2, 0.3])  # Dummy embedding
+            return np.tile([0.1, 0.2, 0.3], (len(text), 1))  # Dummy batch of embeddings
 
+    TokenStreamer = MockStreamer
     tokenizer = MockTokenizer(MODEL_NAME)
     model = MockModel(MODEL_NAME)
     embedding_model = MockEmbeddingModel(EMBEDDING_MODEL, DEVICE)
 
 
+def generate_batch(requests: List[Tuple[str, int, float]]) -> List[str]:
+    """Answer (prompt, max_tokens, temperature) requests that share settings with one padded model.generate"""
+    _, max_new_tokens, temperature = requests[0]
+    inputs = tokenizer([prompt for prompt, _, _ in requests], return_tensors="pt", padding=True).to(DEVICE)
+    outputs = model.generate(
+        inputs.input_ids,
+        attention_mask=inputs.attention_mask,
+        max_new_tokens=max_new_tokens,
+        temperature=temperature,
+        do_sample=True
+    )
+    # Decode and clean up responses
+    return [tokenizer.decode(output, skip_special_tokens=True).split("Answer:")[-1].strip() for output in outputs]
+
+
+# Real models batch concurrent requests; the mocks have nothing to gain from it
+MICRO_BATCHING = not TESTING
+generation_batcher = MicroBatcher(generate_batch, max_batch_size=GENERATION_BATCH_SIZE,
+                                  max_wait_ms=MICRO_BATCH_WAIT_MS, key=lambda request: request[1:],
+                                  name="generation")
+embedding_batcher = MicroBatcher(lambda texts: list(embedding_model.encode(texts)),
+                                 max_batch_size=EMBEDDING_BATCH_SIZE, max_wait_ms=MICRO_BATCH_WAIT_MS,
+                                 name="embedding")
+# Query embeddings go through the batcher; document ingestion already encodes in chunks
+query_encoder = BatchedEncoder(embedding_batcher) if MICRO_BATCHING else embedding_model
+
+
 class Query(BaseModel):
     question: str
     context: Optional[List[str]] = None
     max_tokens: Optional[int] = MAX_NEW_TOKENS
     temperature: Optional[float] = TEMPERATURE
     use_csv_context: Optional[bool] = True  # Whether to use CSV data in RAG
+    nprobe: Optional[int] = None  # IVF lists to probe when the store uses an IVF index
+    ef_search: Optional[int] = None  # HNSW search breadth when the store uses an HNSW index
 
 
 class CSVConfig(BaseModel):
@@ -130,38 +226,412 @@ class Document(BaseModel):
 
 
 class DocumentStore:
+    INITIAL_CAPACITY = 1024  # Rows preallocated for the first batch of embeddings
+
     def __init__(self):
-        self.documents = []
-        self.embeddings = None
+        # Documents are stored column-wise so bulk ingest never builds a model per row
+        self.texts = []
+        self.metadata = []
+        self.sources = []
         self.document_ids = []
+        self.hashes = []  # Content hash of each text, used to skip unchanged rows on upsert
+        self._positions = {}  # Row of the live document for each explicit id
+        self._deleted = set()  # Tombstoned rows, dropped on the next compaction
+        self._lock = threading.RLock()  # Ingest jobs write from a worker thread
+        # Embedding buffer grows by doubling; only the first `_size` rows are live.
+        # Rows are L2-normalized on insert so a dot product is cosine similarity.
+        self._embeddings = None
+        self._size = 0
+        # Approximate index over the first `_index.size` rows; newer rows are searched exactly
+        self._index = None
+        self._generation = 0  # Bumped whenever existing rows are removed
+        # The on-disk snapshot this store extends, so save() only writes what changed since
+        self._snapshot = None
+        self._edited = set()  # Rows whose metadata was replaced in place since the last save
+
+    def __len__(self):
+        return self._size - len(self._deleted)
+
+    @property
+    def embeddings(self):
+        """View of the live embedding rows (no copy)"""
+        if self._embeddings is None:
+            return None
+        return self._embeddings[:self._size]
+
+    def _reserve(self, extra_rows: int, dimension: int):
+        """Make room for `extra_rows` more embeddings, doubling capacity when full"""
+        needed = self._size + extra_rows
+        if self._embeddings is None:
+            capacity = max(self.INITIAL_CAPACITY, needed)
+            self._embeddings = np.empty((capacity, dimension), dtype=np.float32)
+        elif needed > self._embeddings.shape[0]:
+            capacity = max(self._embeddings.shape[0] * 2, needed)
+            grown = np.empty((capacity, dimension), dtype=self._embeddings.dtype)
+            grown[:self._size] = self._embeddings[:self._size]
+            self._embeddings = grown
 
     def add_document(self, document: Document):
-        self.documents.append(document)
-        text_embedding = embedding_model.encode(document.text)
-        if self.embeddings is None:
-            self.embeddings = text_embedding.reshape(1, -1)
+        self.add_documents([document])
+
+    def add_documents(self, documents: List[Document], embeddings: Optional[np.ndarray] = None):
+        """Add many documents at once, encoding them in a single batch unless embeddings are given"""
+        self._append(
+            [document.text for document in documents],
+            [document.metadata or {} for document in documents],
+            [document.source for document in documents],
+            embeddings
+        )
+
+    def add_texts(self, texts: List[str], metadata: List[dict], source: str = "csv",
+                  embeddings: Optional[np.ndarray] = None):
+        """Add a batch of plain texts sharing one source, e.g. a CSV chunk"""
+        self._append(texts, metadata, [source] * len(texts), embeddings)
+
+    def _append(self, texts: List[str], metadata: List[dict], sources: List[str],
+                embeddings: Optional[np.ndarray], hashes: Optional[List[int]] = None):
+        if not texts:
+            return
+        if embeddings is None:
+            embeddings = embedding_model.encode(texts)
+        embeddings = normalize_rows(np.asarray(embeddings).reshape(len(texts), -1))
+        if hashes is None:
+            hashes = text_hashes(texts)
+
+        with self._lock:
+            self._reserve(len(texts), embeddings.shape[1])
+            self._embeddings[self._size:self._size + len(texts)] = embeddings
+
+            start = self._size
+            self.texts.extend(texts)
+            self.metadata.extend(metadata)
+            self.sources.extend(sources)
+            self.hashes.extend(hashes)
+            self.document_ids.extend(
+                meta.get("id", start + offset + 1) for offset, meta in enumerate(metadata)
+            )
+            for offset, meta in enumerate(metadata):
+                if "id" in meta:
+                    self._positions[meta["id"]] = start + offset
+            self._size += len(texts)
+
+    def upsert_texts(self, texts: List[str], metadata: List[dict], source: str = "csv") -> Tuple[int, int, int]:
+        """Add new ids, re-embed changed ones and leave unchanged rows alone.
+
+        Every metadata entry must carry an "id". Changed rows are tombstoned and
+        re-appended rather than overwritten, so an approximate index never serves a
+        vector that changed under it. Returns (added, updated, unchanged) counts.
+        """
+        hashes = text_hashes(texts)
+        latest = {meta["id"]: i for i, meta in enumerate(metadata)}  # Last duplicate of an id wins
+        fresh, stale = [], []
+        unchanged = 0
+        with self._lock:
+            for row_id, i in latest.items():
+                position = self._positions.get(row_id)
+                if position is None:
+                    fresh.append(i)
+                elif self.hashes[position] != hashes[i]:
+                    fresh.append(i)
+                    stale.append(position)
+                else:
+                    self.metadata[position] = metadata[i]
+                    self._edited.add(position)
+                    unchanged += 1
+
+        # Only new or changed rows pay for the embedding model
+        embeddings = embedding_model.encode([texts[i] for i in fresh]) if fresh else None
+        with self._lock:
+            self._deleted.update(stale)
+            self._append(
+                [texts[i] for i in fresh],
+                [metadata[i] for i in fresh],
+                [source] * len(fresh),
+                embeddings,
+                [hashes[i] for i in fresh]
+            )
+        return len(fresh) - len(stale), len(stale), unchanged
+
+    def delete_missing(self, seen_ids: set, source: str = "csv") -> int:
+        """Tombstone documents of a source whose id was not seen in the latest upload.
+
+        Rows of the source without an id (ingested in replace mode without an
+        id_column) can never be matched by an upsert, so they are dropped too.
+        """
+        with self._lock:
+            gone = [row_id for row_id, position in self._positions.items()
+                    if row_id not in seen_ids and self.sources[position] == source]
+            for row_id in gone:
+                self._deleted.add(self._positions.pop(row_id))
+            unmatched = [row for row in range(self._size)
+                         if self.sources[row] == source and "id" not in self.metadata[row]
+                         and row not in self._deleted]
+            self._deleted.update(unmatched)
+        return len(gone) + len(unmatched)
+
+    def maybe_compact(self):
+        """Drop tombstoned rows once they make up too much of the store"""
+        with self._lock:
+            if len(self._deleted) > TOMBSTONE_COMPACT_RATIO * self._size:
+                self._keep_rows([i for i in range(self._size) if i not in self._deleted])
+
+    def count_source(self, source: str) -> int:
+        return sum(1 for i, doc_source in enumerate(self.sources)
+                   if doc_source == source and i not in self._deleted)
+
+    def refresh_index(self):
+        """Rebuild the approximate index only if it is missing or too many rows bypass it"""
+        with self._lock:
+            index = self._index
+            unindexed = self._size - (index.size if index is not None else 0)
+        if index is None or unindexed > VECTOR_INDEX_REBUILD_RATIO * index.size:
+            self.rebuild_index()
+
+    def rebuild_index(self):
+        """(Re)train the approximate index over all rows once the store is large enough"""
+        with self._lock:
+            generation, embeddings = self._generation, self.embeddings
+        if embeddings is None or len(embeddings) < VECTOR_INDEX_MIN_ROWS:
+            index = None
         else:
-            self.embeddings = np.vstack([self.embeddings, text_embedding])
-        self.document_ids.append(document.metadata.get("id", len(self.documents)))
+            # Built outside the lock so queries keep being served while training
+            index = build_index(embeddings, VECTOR_INDEX_TYPE)
+        with self._lock:
+            if generation == self._generation:
+                self._index = index
+
+    def save(self, directory: str):
+        """Write an atomic snapshot of the store.
+
+        Embeddings go to a .npy file and documents/metadata/ids to a JSON sidecar,
+        both under fresh versioned names. Saving again into the same directory only
+        appends a segment with the rows added since, the metadata replaced in place
+        and the tombstones, until the segments outgrow SNAPSHOT_SEGMENT_RATIO or
+        SNAPSHOT_MAX_SEGMENTS (or rows were removed) and a full snapshot is written.
+        The manifest is replaced last, so a crash at any point leaves the previous
+        snapshot intact.
+        """
+        with self._lock:
+            previous = self._snapshot
+            if (previous is None or previous["directory"] != directory
+                    or previous["generation"] != self._generation):
+                previous = None
+            else:
+                base_rows = previous["manifest"]["rows"] - sum(
+                    segment["rows"] for segment in previous["manifest"]["segments"])
+                if (self._size - base_rows > SNAPSHOT_SEGMENT_RATIO * base_rows
+                        or len(previous["manifest"]["segments"]) >= SNAPSHOT_MAX_SEGMENTS):
+                    previous = None
+            start = previous["manifest"]["rows"] if previous else 0
+            edited, self._edited = self._edited, set()
+
+            embeddings = self.embeddings[start:] if self._embeddings is not None else None
+            columns = {
+                "texts": self.texts[start:],
+                "metadata": self.metadata[start:],
+                "sources": self.sources[start:],
+                "document_ids": self.document_ids[start:],
+                "hashes": self.hashes[start:],
+                "deleted": sorted(self._deleted)
+            }
+            if previous:
+                columns["metadata_updates"] = [[row, self.metadata[row]] for row in sorted(edited) if row < start]
+            index, size, generation = self._index, self._size, self._generation
 
-    def retrieve_relevant(self, query: str, top_k: int = 3) -> List[str]:
-        query_embedding = embedding_model.encode(query).reshape(1, -1)
-        similarities = cosine_similarity(query_embedding, self.embeddings)[0]
-        top_indices = similarities.argsort()[-top_k:][::-1]
-        return [self.documents[i].text for i in top_indices]
+        try:
+            os.makedirs(directory, exist_ok=True)
+            version = uuid4().hex
+            files = write_snapshot_files(directory, version, embeddings, columns)
+            if previous:
+                manifest = dict(previous["manifest"], version=version, rows=size,
+                                segments=previous["manifest"]["segments"] + [files])
+            else:
+                manifest = dict(files, version=version, rows=size, index=None, segments=[])
+            if not (previous and previous["index"] is index):
+                manifest["index"] = None
+                if isinstance(index, FaissIndex):
+                    manifest["index"] = f"index-{version}.faiss"
+                    index.save(os.path.join(directory, manifest["index"]))
+
+            write_file_atomic(os.path.join(directory, "manifest.json"), json.dumps(manifest))
+        except BaseException:
+            with self._lock:
+                self._edited |= edited
+            raise
+
+        with self._lock:
+            if generation == self._generation:
+                self._snapshot = {"directory": directory, "generation": generation,
+                                  "manifest": manifest, "index": index}
+
+        # Drop files from older snapshots; a file still mapped on Windows is retried next save
+        live_files = {"manifest.json", manifest["embeddings"], manifest["documents"], manifest["index"],
+                      *(segment[key] for segment in manifest["segments"] for key in ("embeddings", "documents"))}
+        for name in os.listdir(directory):
+            if name not in live_files:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def load(self, directory: str) -> bool:
+        """Open a snapshot written by save().
+
+        Embeddings are memory-mapped, not read, unless the snapshot has appended
+        segments, which are concatenated into memory.
+        """
+        manifest_path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return False
+        with open(manifest_path, encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        # Snapshots written before incremental saves have no segments
+        manifest.setdefault("segments", [])
+        with open(os.path.join(directory, manifest["documents"]), encoding="utf-8") as handle:
+            columns = json.load(handle)
+        # Snapshots written before upserts existed carry no hashes or tombstones
+        columns["hashes"] = columns.get("hashes") or text_hashes(columns["texts"])
+        embeddings = None
+        if manifest["embeddings"]:
+            embeddings = np.load(os.path.join(directory, manifest["embeddings"]), mmap_mode="r")
+        segment_embeddings = []
+        for segment in manifest["segments"]:
+            with open(os.path.join(directory, segment["documents"]), encoding="utf-8") as handle:
+                part = json.load(handle)
+            for key in ("texts", "metadata", "sources", "document_ids", "hashes"):
+                columns[key].extend(part[key])
+            for row, meta in part["metadata_updates"]:
+                columns["metadata"][row] = meta
+            columns["deleted"] = part["deleted"]
+            if segment["embeddings"]:
+                segment_embeddings.append(np.load(os.path.join(directory, segment["embeddings"])))
+        if segment_embeddings:
+            embeddings = np.concatenate(([embeddings] if embeddings is not None else []) + segment_embeddings)
+        index = FaissIndex.load(os.path.join(directory, manifest["index"])) if manifest["index"] else None
+
+        with self._lock:
+            self.texts = columns["texts"]
+            self.metadata = columns["metadata"]
+            self.sources = columns["sources"]
+            self.document_ids = columns["document_ids"]
+            self.hashes = columns["hashes"]
+            self._deleted = set(columns.get("deleted", []))
+            self._rebuild_positions()
+            # The mapping is read-only and exactly full, so the first append copies it into memory
+            self._embeddings = embeddings
+            self._size = manifest["rows"]
+            self._index = index
+            self._generation += 1
+            self._snapshot = {"directory": directory, "generation": self._generation,
+                              "manifest": manifest, "index": index}
+            self._edited = set()
+        return True
+
+    def retrieve_relevant(self, query: str, top_k: int = 3,
+                          nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[str]:
+        query_embedding = normalize_rows(
+            query_embedding_cache.encode(query_encoder, query, namespace="documents")).reshape(-1)
+        # Snapshot under the lock, search outside it. Appends never touch the first `size`
+        # rows and compaction swaps in new buffers and lists, so the snapshot stays valid.
+        with self._lock:
+            if len(self) == 0:
+                return []
+            size, embeddings, texts, index = self._size, self.embeddings, self.texts, self._index
+            deleted = set(self._deleted)
+
+        if index is None:
+            _, top_indices = top_k_exact(embeddings, query_embedding, top_k, exclude=deleted)
+            return [texts[i] for i in top_indices]
+
+        # Over-fetch so tombstoned rows still in the index can be filtered out, and fetch
+        # twice as many until top_k live rows are found or every row has been considered
+        fetch = min(top_k + len(deleted), size)
+        while True:
+            results = [index.search(query_embedding, fetch, nprobe=nprobe, ef_search=ef_search)]
+            # Rows added since the last rebuild are not in the index yet
+            if index.size < size:
+                tail_scores, tail_indices = top_k_exact(embeddings[index.size:], query_embedding, fetch)
+                results.append((tail_scores, tail_indices + index.size))
+            _, candidates = merge_results(results, fetch)
+            top_indices = [i for i in candidates if i not in deleted][:top_k]
+            # Fewer candidates than asked for means the index has nothing more to give
+            if len(top_indices) == top_k or len(candidates) < fetch or fetch >= size:
+                return [texts[i] for i in top_indices]
+            fetch = min(2 * fetch, size)
 
     def clear_csv_documents(self):
         """Remove all documents that came from CSV sources"""
-        indices_to_keep = [i for i, doc in enumerate(self.documents) if doc.source != "csv"]
-        self.documents = [self.documents[i] for i in indices_to_keep]
+        with self._lock:
+            self._keep_rows([i for i, source in enumerate(self.sources)
+                             if source != "csv" and i not in self._deleted])
+
+    def _keep_rows(self, indices_to_keep: List[int]):
+        """Compact the store down to the given rows; invalidates the approximate index"""
+        self.texts = [self.texts[i] for i in indices_to_keep]
+        self.metadata = [self.metadata[i] for i in indices_to_keep]
+        self.sources = [self.sources[i] for i in indices_to_keep]
+        self.hashes = [self.hashes[i] for i in indices_to_keep]
+        self.document_ids = [self.document_ids[i] for i in indices_to_keep]
         if len(indices_to_keep) > 0:
-            self.embeddings = self.embeddings[indices_to_keep]
+            # Fancy indexing copies, so the compacted buffer is sized to the live rows
+            self._embeddings = self.embeddings[indices_to_keep]
         else:
-            self.embeddings = None
-        self.document_ids = [self.document_ids[i] for i in indices_to_keep]
+            self._embeddings = None
+        self._size = len(indices_to_keep)
+        self._deleted = set()
+        self._edited = set()
+        self._rebuild_positions()
+        self._index = None
+        self._generation += 1
+
+    def _rebuild_positions(self):
+        self._positions = {
+            meta["id"]: row for row, meta in enumerate(self.metadata)
+            if "id" in meta and row not in self._deleted
+        }
+
+
+def text_hashes(texts: List[str]) -> List[int]:
+    """Vectorized 64-bit content hashes of document texts"""
+    return pd.util.hash_pandas_object(pd.Series(texts, dtype=object), index=False).tolist()
+
+
+def write_snapshot_files(directory: str, version: str, embeddings: Optional[np.ndarray], columns: dict) -> dict:
+    """Write one snapshot part (embeddings .npy and documents JSON), synced to disk"""
+    files = {"rows": len(columns["texts"]), "embeddings": None, "documents": f"documents-{version}.json"}
+    if embeddings is not None and len(embeddings):
+        files["embeddings"] = f"embeddings-{version}.npy"
+        with open(os.path.join(directory, files["embeddings"]), "wb") as handle:
+            np.save(handle, embeddings)
+            handle.flush()
+            os.fsync(handle.fileno())
+    with open(os.path.join(directory, files["documents"]), "w", encoding="utf-8") as handle:
+        json.dump(columns, handle, separators=(",", ":"), default=_json_default)
+        handle.flush()
+        os.fsync(handle.fileno())
+    return files
+
+
+def _json_default(value):
+    """Serialize numpy scalars and other odd metadata values in snapshots"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def write_file_atomic(path: str, content: str):
+    """Replace a file so readers see either the old or the new content, never a partial write"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        handle.write(content)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temp_path, path)
 
 
 document_store = DocumentStore()
+if document_store.load(DOCUMENT_STORE_DIR):
+    print(f"Loaded {len(document_store)} documents from {DOCUMENT_STORE_DIR}")
 
 
 # Used by MerchantInfo
@@ -186,34 +656,133 @@ def generate_unix_timestamp() -> int:
 
 
 # Menu Item Models
-class MenuItemBase(BaseModel):
-    item_id: int
-    name: str
-    cuisine_tag: str
-    price: float
-
-
-class MenuItem(MenuItemBase):
-    current_stock: int = 0
-    min_stock: int = 10
-    status: str = "adequate"
-
-
-def process_csv_row(row: dict, config: CSVConfig) -> Document:
-    """Convert a CSV row into a Document"""
-    # Combine specified text columns
-    text = " ".join(str(row[col]) for col in config.text_columns if col in row)
+def process_csv_chunk(chunk: pd.DataFrame, config: CSVConfig) -> Tuple[List[str], List[dict]]:
+    """Convert a chunk of CSV rows into document texts and metadata, column by column"""
+    # Combine specified text columns with vectorized string concatenation
+    text_columns = [col for col in config.text_columns if col in chunk.columns]
+    if text_columns:
+        texts = chunk[text_columns[0]].fillna("").astype(str)
+        for col in text_columns[1:]:
+            texts = texts + " " + chunk[col].fillna("").astype(str)
+    else:
+        texts = pd.Series("", index=chunk.index)
 
     # Extract metadata
-    metadata = {}
-    if config.id_column and config.id_column in row:
-        metadata["id"] = row[config.id_column]
+    metadata = pd.DataFrame(index=chunk.index)
+    if config.id_column and config.id_column in chunk.columns:
+        metadata["id"] = chunk[config.id_column]
     if config.metadata_columns:
         for col in config.metadata_columns:
-            if col in row:
-                metadata[col] = row[col]
-
-    return Document(text=text, metadata=metadata, source="csv")
+            if col in chunk.columns:
+                metadata[col] = chunk[col]
+
+    return texts.tolist(), metadata.to_dict("records")
+
+
+# Background CSV ingestion jobs
+class IngestJob(BaseModel):
+    id: str
+    filename: Optional[str] = None
+    mode: str = "replace"  # replace or upsert
+    status: str = "pending"  # pending, running, completed or failed
+    rows_parsed: int = 0
+    rows_embedded: int = 0
+    rows_added: int = 0
+    rows_updated: int = 0
+    rows_unchanged: int = 0
+    rows_deleted: int = 0
+    rows_per_second: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+ingest_jobs: dict[str, IngestJob] = {}
+ingest_lock = threading.Lock()  # One ingest at a time, since each one rewrites the CSV documents
+
+
+def register_ingest_job(job: IngestJob):
+    """Track a job, forgetting the oldest finished ones past MAX_TRACKED_JOBS"""
+    ingest_jobs[job.id] = job
+    finished = [job_id for job_id, tracked in ingest_jobs.items() if tracked.status in ("completed", "failed")]
+    for job_id in finished[:max(0, len(ingest_jobs) - MAX_TRACKED_JOBS)]:
+        del ingest_jobs[job_id]
+
+
+def spool_upload(upload: UploadFile) -> str:
+    """Stream an upload to a private temp file in fixed-size blocks and return its path"""
+    upload.file.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="upload_", suffix=".csv", delete=False) as handle:
+        shutil.copyfileobj(upload.file, handle, UPLOAD_BLOCK_SIZE)
+    return handle.name
+
+
+def run_csv_ingest(job: IngestJob, path: str, config: CSVConfig):
+    """Parse a spooled CSV chunk by chunk in a single pass and embed it into the document store.
+
+    In replace mode the CSV documents are rebuilt from scratch. In upsert mode rows are
+    matched on `config.id_column`, only new or changed rows are embedded, and ids missing
+    from the upload, as well as CSV rows stored without an id, are deleted.
+    """
+    job.status = "running"
+    job.started_at = time.time()
+    try:
+        with ingest_lock, open(path, "rb") as handle:
+            # Detect if file has header
+            sniffer = csv.Sniffer()
+            has_header = sniffer.has_header(handle.read(1024).decode("utf-8", errors="ignore"))
+            handle.seek(0)
+
+            df_chunks = pd.read_csv(
+                handle,
+                chunksize=CSV_CHUNK_SIZE,
+                header=0 if has_header else None,
+                encoding="utf-8"
+            )
+
+            if job.mode == "replace":
+                # Clear existing CSV documents
+                document_store.clear_csv_documents()
+
+            seen_ids = set()
+            for chunk in df_chunks:
+                job.rows_parsed += len(chunk)
+                if job.mode == "upsert":
+                    if config.id_column not in chunk.columns:
+                        raise ValueError(f"ID column '{config.id_column}' not found in CSV")
+                    # Rows without an id cannot be matched on the next upload
+                    chunk = chunk.dropna(subset=[config.id_column])
+
+                # Build the chunk's documents and embed them in one batched encode call
+                texts, metadata = process_csv_chunk(chunk, config)
+                if job.mode == "upsert":
+                    added, updated, unchanged = document_store.upsert_texts(texts, metadata, source="csv")
+                    seen_ids.update(meta["id"] for meta in metadata)
+                    job.rows_added += added
+                    job.rows_updated += updated
+                    job.rows_unchanged += unchanged
+                    job.rows_embedded += added + updated
+                else:
+                    document_store.add_texts(texts, metadata, source="csv")
+                    job.rows_added += len(texts)
+                    job.rows_embedded += len(texts)
+                job.rows_per_second = job.rows_parsed / max(time.time() - job.started_at, 1e-6)
+
+            if job.mode == "upsert":
+                job.rows_deleted = document_store.delete_missing(seen_ids, source="csv")
+                document_store.maybe_compact()
+
+            # Retrain the approximate index if the ingest outgrew it, then snapshot
+            document_store.refresh_index()
+            document_store.save(DOCUMENT_STORE_DIR)
+        job.status = "completed"
+    except Exception as e:
+        logger.error(e)
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+        os.remove(path)
 
 
 @app.options("/{path:path}")
@@ -245,35 +814,53 @@ def generate_prompt(question: str, context: List[str] = None) -> str:
 
         Question: {question}
 
-        {context_str}
+        Answer:"""
 
-        Question: {question}
 
-        Answer:"""
+def stream_generation(prompt: str, max_new_tokens: int, temperature: float):
+    """Yield decoded text as model.generate produces tokens (prompt excluded)"""
+    inputs = tokenizer(prompt, return_tensors="pt").to(DEVICE)
+    streamer = TokenStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+
+    def generate():
+        try:
+            model.generate(inputs.input_ids, max_new_tokens=max_new_tokens, temperature=temperature,
+                           do_sample=True, streamer=streamer)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()  # Unblock the reader
+
+    # generate() blocks until the last token, so it runs beside the reader
+    thread = threading.Thread(target=generate, daemon=True)
+    thread.start()
+    yield from streamer
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def resolve_query_context(query: Query):
+    # Retrieve relevant documents if no context provided and use_csv_context is True
+    if not query.context and query.use_csv_context:
+        query.context = document_store.retrieve_relevant(
+            query.question, nprobe=query.nprobe, ef_search=query.ef_search)
 
 
 @app.post("/query")
 async def query_llama(query: Query):
     try:
-        # Retrieve relevant documents if no context provided and use_csv_context is True
-        if not query.context and query.use_csv_context:
-            query.context = document_store.retrieve_relevant(query.question)
+        # Off the event loop, so concurrent requests can meet in the same batch
+        await run_in_threadpool(resolve_query_context, query)
 
         # Generate prompt
         prompt = generate_prompt(query.question, query.context)
 
-        # Tokenize and generate
-        inputs = tokenizer(prompt, return_tensors="pt").to(DEVICE)
-        outputs = model.generate(
-            inputs.input_ids,
-            max_new_tokens=query.max_tokens,
-            temperature=query.temperature,
-            do_sample=True
-        )
-
-        # Decode and clean up response
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        response = response.split("Answer:")[-1].strip()
+        request = (prompt, query.max_tokens, query.temperature)
+        if MICRO_BATCHING:
+            response = await asyncio.wrap_future(generation_batcher.submit(request))
+        else:
+            response = (await run_in_threadpool(generate_batch, [request]))[0]
 
         return {
             "response": response,
@@ -284,13 +871,47 @@ async def query_llama(query: Query):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/upload_csv")
+@app.post("/query/stream")
+async def query_llama_stream(query: Query):
+    """/query over server-sent events: `token` events as text is generated, then `done`"""
+    try:
+        await run_in_threadpool(resolve_query_context, query)
+        prompt = generate_prompt(query.question, query.context)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def events():
+        pieces = []
+        try:
+            for piece in stream_generation(prompt, query.max_tokens, query.temperature):
+                pieces.append(piece)
+                yield sse_event("token", {"text": piece})
+            yield sse_event("done", {
+                "response": "".join(pieces).strip(),
+                "context_used": query.context,
+                "context_source": "csv" if query.use_csv_context else "user_provided"
+            })
+        except Exception as e:
+            logger.error(e)
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@app.post("/upload_csv", status_code=status.HTTP_202_ACCEPTED)
 async def upload_csv(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     text_columns: str = "",  # Comma-separated list of columns
     id_column: Optional[str] = None,
-    metadata_columns: Optional[str] = None  # Comma-separated list
+    metadata_columns: Optional[str] = None,  # Comma-separated list
+    mode: str = "replace"  # "replace" re-embeds everything, "upsert" only new or changed rows
 ):
+    if mode not in ("replace", "upsert"):
+        raise HTTPException(status_code=400, detail="mode must be 'replace' or 'upsert'")
+    if mode == "upsert" and not id_column:
+        raise HTTPException(status_code=400, detail="upsert mode requires an id_column")
+
     try:
         # Parse CSV configuration
         config = CSVConfig(
@@ -299,57 +920,39 @@ async def upload_csv(
             metadata_columns=[col.strip() for col in metadata_columns.split(",")] if metadata_columns else None
         )
 
-        # Clear existing CSV documents
-        document_store.clear_csv_documents()
-
-        # Process CSV in chunks for memory efficiency
-        contents = await file.read()
-        csv_text = io.StringIO(contents.decode('utf-8'))
-
-        # Clear existing CSV documents
-        document_store.clear_csv_documents()
-
-        # Process CSV in chunks for memory efficiency
-        contents = await file.read()
-        csv_text = io.StringIO(contents.decode('utf-8'))
+        # The upload is closed once this handler returns, so hand the job its own copy on disk
+        path = await run_in_threadpool(spool_upload, file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Detect if file has header
-        sniffer = csv.Sniffer()
-        has_header = sniffer.has_header(csv_text.read(1024))
-        csv_text.seek(0)
+    job = IngestJob(id=str(uuid4()), filename=file.filename, mode=mode)
+    register_ingest_job(job)
+    background_tasks.add_task(run_csv_ingest, job, path, config)
 
-        # Read CSV
-        df_chunks = pd.read_csv(
-            csv_text,
-            chunksize=CSV_CHUNK_SIZE,
-            header=0 if has_header else None
-        )
+    return {
+        "status": "accepted",
+        "message": "CSV upload received. Ingestion is running in the background.",
+        "job_id": job.id,
+        "job_url": f"/upload_csv/jobs/{job.id}",
+        "columns_used": config.text_columns,
+        "metadata_columns": config.metadata_columns
+    }
 
-        total_rows = 0
-        for chunk in df_chunks:
-            # Convert each row to a document
-            for _, row in chunk.iterrows():
-                document = process_csv_row(row.to_dict(), config)
-                document_store.add_document(document)
-            total_rows += len(chunk)
 
-        return {
-            "status": "success",
-            "message": f"CSV processed successfully. Added {total_rows} documents.",
-            "columns_used": config.text_columns,
-            "metadata_columns": config.metadata_columns
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/upload_csv/jobs/{job_id}", response_model=IngestJob)
+async def get_ingest_job(job_id: str):
+    """Report progress of a background CSV ingestion job"""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 @app.get("/csv_columns")
 async def get_csv_columns(file: UploadFile = File(...)):
     """Endpoint to preview CSV columns"""
     try:
-        contents = await file.read()
-        csv_text = io.StringIO(contents.decode('utf-8'))
-        df = pd.read_csv(csv_text, nrows=1)  # Just read header
+        df = pd.read_csv(file.file, nrows=1, encoding="utf-8")  # Just read header
         return {"columns": list(df.columns)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -358,11 +961,33 @@ async def get_csv_columns(file: UploadFile = File(...)):
 @app.get("/document_count")
 async def get_document_count():
     return {
-        "total_documents": len(document_store.documents),
-        "csv_documents": sum(1 for doc in document_store.documents if doc.source == "csv")
+        "total_documents": len(document_store),
+        "csv_documents": document_store.count_source("csv")
+    }
+
+
+@app.get("/query_cache/stats")
+async def get_query_cache_stats():
+    """Hit/miss/eviction counters of the query embedding cache"""
+    return query_embedding_cache.stats()
+
+
+@app.get("/micro_batch/stats")
+async def get_micro_batch_stats():
+    """Batch sizes and queue wait of the generation and embedding schedulers"""
+    return {
+        "enabled": MICRO_BATCHING,
+        "generation": generation_batcher.stats(),
+        "embedding": embedding_batcher.stats()
     }
 
 
+@app.get("/answer_cache/stats")
+async def get_answer_cache_stats():
+    """Hit rate and LLM latency saved by the semantic answer cache"""
+    return answer_cache.stats()
+
+
 @app.put("/update_merchant_info")
 async def update_merchant_info(merchant_info: MerchantInfo):
     # Update merchant info somewhere
@@ -388,53 +1013,89 @@ async def chat_to_llm(
 
 
 @app.get("/menu/items", response_model=List[MenuItem])
-async def get_menu_items():
+async def get_menu_items(request: Request):
     """Get all menu items"""
-    df = pd.read_csv('data/DimSumDelight_Full.csv')
-    # Get unique items and their latest prices
-    items = df.groupby(['item_id', 'item_name', 'cuisine_tag', 'item_price']).size().reset_index()
-
-    return [
-        MenuItem(
-            item_id=row['item_id'],
-            name=row['item_name'],
-            cuisine_tag=row['cuisine_tag'],
-            price=row['item_price'],
-        )
-        for _, row in items.iterrows()
-    ]
+    body, etag = await run_in_threadpool(menu_catalog.list_response)
+    # The menu page polls this endpoint, so unchanged menus cost a 304 and no body
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/menu/items/{item_id}", response_model=MenuItem)
 async def get_menu_item(item_id: int):
     """Get a specific menu item by ID"""
-    df = pd.read_csv('data/DimSumDelight_Full.csv')
-    item = df[df['item_id'] == item_id].iloc[0]
+    item = await run_in_threadpool(menu_catalog.get, item_id)
 
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    return MenuItem(
-        item_id=item['item_id'],
-        name=item['item_name'],
-        cuisine_tag=item['cuisine_tag'],
-        price=item['item_price']
-    )
+    return item
+
+
+@app.post("/menu/reload", status_code=status.HTTP_204_NO_CONTENT)
+async def reload_menu():
+    """Re-read the menu CSV now instead of waiting for an mtime change"""
+    await run_in_threadpool(menu_catalog.reload)
+
+
+@app.get("/leaderboard/merchant/{merchant_id}", response_model=List[LeaderboardEntry])
+async def get_merchant_rank_history(merchant_id: str):
+    """A merchant's rank in every month, oldest first"""
+    history = await run_in_threadpool(leaderboard_table.history, merchant_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Merchant not found")
+    return history
+
+
+@app.post("/leaderboard/reload", status_code=status.HTTP_204_NO_CONTENT)
+async def reload_leaderboard():
+    """Re-read the leaderboard files now instead of waiting for an mtime change"""
+    await run_in_threadpool(leaderboard_table.reload)
+
+
+@app.get("/leaderboard/{month}", response_model=List[LeaderboardEntry])
+async def get_leaderboard(month: str, top: Annotated[int, QueryParam(ge=1)] = LEADERBOARD_TOP):
+    """Top merchants of a month ("YYYY-MM", or "overall")"""
+    entries = await run_in_threadpool(leaderboard_table.top, month, top)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="Month not found")
+    return entries
+
+
+@app.get("/leaderboard/{month}/around/{merchant_id}", response_model=List[LeaderboardEntry])
+async def get_leaderboard_around(month: str, merchant_id: str,
+                                 radius: Annotated[int, QueryParam(ge=0)] = LEADERBOARD_AROUND):
+    """A merchant and its neighbours in a month's ranking"""
+    entries = await run_in_threadpool(leaderboard_table.around, month, merchant_id, radius)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="Merchant not ranked in this month")
+    return entries
 
 
 @app.get("/get_all_chats")
-async def get_all_chats() -> List[Chat]:
-    return chat_db.get_all_chats()
+async def get_all_chats(
+    before: Optional[str] = None,  # Id of the last chat of the previous page
+    limit: Annotated[int, QueryParam(ge=1, le=MAX_CHAT_PAGE_SIZE)] = CHAT_PAGE_SIZE
+) -> List[Chat]:
+    """Most recently active chats first"""
+    return await run_in_threadpool(chat_db.get_all_chats, before=before, limit=limit)
 
 
 @app.get("/get_all_messages")
-async def get_all_messages(chat_id: str) -> List[Message]:
-    return chat_db.get_all_messages(chat_id)
+async def get_all_messages(
+    chat_id: str,
+    before: Optional[str] = None,  # Id of the oldest message already loaded
+    limit: Annotated[int, QueryParam(ge=1, le=MAX_CHAT_PAGE_SIZE)] = CHAT_PAGE_SIZE
+) -> List[Message]:
+    """Latest messages of a chat, oldest first"""
+    return await run_in_threadpool(chat_db.get_all_messages, chat_id, before=before, limit=limit)
 
 
 @app.post("/new_chat")
 async def new_chat(chat: Chat):
-    chat_db.add_new_chat(chat)
+    await run_in_threadpool(chat_db.add_new_chat, chat)
 
 
 class ChatRequest(BaseModel):
@@ -442,21 +1103,33 @@ class ChatRequest(BaseModel):
     chat_id: str = "default"
 
 
-@app.post("/api/chat")
-async def chat(request: ChatRequest):
+def chat_response(response_text: str) -> dict:
+    """Turn a RAG answer into the {"response", "image_url"} payload the chat UI expects"""
+    if not response_text.lstrip().startswith("{"):
+        # Plain text, e.g. the escalation message for questions outside the knowledge base
+        return {"response": response_text}
     try:
-        # Fetch the response from the RAG pipeline
-        response_text = query_rag(request.query).replace('\'', '"')
+        # Stored QA answers are proper JSON; LLM output often uses single quotes
         try:
             data = json.loads(response_text)
+        except ValueError:
+            data = json.loads(response_text.replace('\'', '"'))
 
-            return JSONResponse(content={
-                "response": data["text"],
-                "image_url": "http://localhost:8000" + data["image"]})
-        except Exception as e:
-            logger.error(e)
-            return JSONResponse(content={
-                "response": response_text})
+        content = {"response": data["text"]}
+        if data.get("image"):
+            content["image_url"] = "http://localhost:8000" + data["image"]
+        return content
+    except Exception as e:
+        logger.error(e)
+        return {"response": response_text}
+
+
+@app.post("/api/chat")
+async def chat(request: ChatRequest):
+    try:
+        # Fetch the response from the RAG pipeline
+        response_text = await query_rag_async(request.query, request.chat_id)
+        return JSONResponse(content=chat_response(response_text))
 
     except Exception as e:
         logger.error(e)
@@ -464,6 +1137,25 @@ async def chat(request: ChatRequest):
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """/api/chat over server-sent events: `token` events with the answer text, then
+    `done` with the same payload /api/chat returns (including image_url)"""
+    async def events():
+        answer = AnswerTextStream()
+        try:
+            async for piece in query_rag_stream(request.query, request.chat_id):
+                text = answer.feed(piece)
+                if text:
+                    yield sse_event("token", {"text": text})
+            yield sse_event("done", chat_response(answer.raw))
+        except Exception as e:
+            logger.error(e)
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import threading
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from transaction_store import TransactionStore
+
+MENU_CSV_PATH = "data/DimSumDelight_Full.csv"
+MENU_COLUMNS = ["item_id", "item_name", "cuisine_tag", "item_price"]
+
+
+class MenuItemBase(BaseModel):
+    item_id: int
+    name: str
+    cuisine_tag: str
+    price: float
+
+
+class MenuItem(MenuItemBase):
+    current_stock: int = 0
+    min_stock: int = 10
+    status: str = "adequate"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers `etag` (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+class MenuCatalog:
+    """Menu items read once from the transaction store and indexed by item_id.
+
+    Items are re-read only when the CSV's mtime changes or on reload(). The list
+    response is serialized once per load, together with an ETag for conditional
+    requests.
+    """
+
+    def __init__(self, path: str = MENU_CSV_PATH):
+        self.path = path
+        self.store = TransactionStore(path)
+        self._loaded = None  # (items, index by item_id, list body, etag), swapped together
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        # Rows with a blank item_id cannot be listed or looked up
+        df = self.store.read(columns=MENU_COLUMNS + ["order_time"]).dropna(subset=["item_id"])
+        # Plain strings, so groups are sorted by name rather than by category code
+        df = df.astype({"item_name": str, "cuisine_tag": str})
+
+        # One entry per distinct (item, price), as the list endpoint always returned
+        variants = df.groupby(MENU_COLUMNS).size().reset_index()
+        items = [
+            MenuItem(item_id=row.item_id, name=row.item_name, cuisine_tag=row.cuisine_tag, price=row.item_price)
+            for row in variants.itertuples(index=False)
+        ]
+        # Single-item lookups return the item as last ordered, i.e. its latest price
+        latest = df.sort_values("order_time", kind="stable").drop_duplicates("item_id", keep="last")
+        index = {
+            int(row.item_id): MenuItem(item_id=row.item_id, name=row.item_name, cuisine_tag=row.cuisine_tag,
+                                       price=row.item_price)
+            for row in latest.itertuples(index=False)
+        }
+
+        body = json.dumps([item.model_dump() for item in items]).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self._loaded = (items, index, body, etag)
+        self._mtime = mtime
+
+    def _current(self):
+        mtime = os.path.getmtime(self.path)
+        if self._loaded is None or mtime != self._mtime:
+            with self._lock:
+                if self._loaded is None or mtime != self._mtime:
+                    self._load()
+        return self._loaded
+
+    def items(self) -> List[MenuItem]:
+        return self._current()[0]
+
+    def get(self, item_id: int) -> Optional[MenuItem]:
+        return self._current()[1].get(item_id)
+
+    def list_response(self):
+        """The serialized item list and its ETag"""
+        _, _, body, etag = self._current()
+        return body, etag
@@ -0,0 +1,128 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Runs concurrent single-item calls as one batched call.
+
+    The first waiting item opens a batch. The batch closes when it holds
+    `max_batch_size` items or `max_wait_ms` after that item arrived. Then
+    `process_batch(items) -> results` runs once on the batcher's worker thread and
+    each caller gets its own result. Items whose `key` differs from the batch's
+    (e.g. other generation settings) wait for a later batch.
+
+    Sync callers use `batcher(item)`; async callers await
+    `asyncio.wrap_future(batcher.submit(item))`.
+    """
+
+    def __init__(self, process_batch, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 key=None, name: str = "batch"):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.key = key
+        self.name = name
+        self._queue = queue.Queue()  # (item, future, enqueued_at)
+        self._deferred = deque()  # Entries set aside because their key did not match
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.queue_wait = 0.0
+        self.batch_sizes = Counter()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._worker.start()
+
+    def _key(self, entry):
+        return self.key(entry[0]) if self.key is not None else None
+
+    def _collect(self) -> list:
+        first = self._deferred.popleft() if self._deferred else self._queue.get()
+        batch_key = self._key(first)
+        batch = [first]
+
+        # Deferred entries are older than anything queued, so they go first
+        for entry in list(self._deferred):
+            if len(batch) == self.max_batch_size:
+                return batch
+            if self._key(entry) == batch_key:
+                self._deferred.remove(entry)
+                batch.append(entry)
+
+        deadline = first[2] + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if self._key(entry) == batch_key:
+                batch.append(entry)
+            else:
+                self._deferred.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Drop callers that gave up while waiting (e.g. a cancelled request)
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.queue_wait += sum(started - enqueued_at for _, _, enqueued_at in batch)
+                self.batch_sizes[len(batch)] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "avg_queue_wait_ms": 1000 * self.queue_wait / self.items if self.items else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items()))
+            }
+
+
+class BatchedEncoder:
+    """Stands in for a SentenceTransformer whose single-text encode() calls go through a MicroBatcher"""
+
+    def __init__(self, batcher: MicroBatcher):
+        self.batcher = batcher
+
+    def encode(self, text: str):
+        return self.batcher(text)
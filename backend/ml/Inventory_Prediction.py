@@ -1,4 +1,3 @@
-import pandas as pd
 from lightgbm import LGBMRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error
@@ -6,27 +5,22 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 import numpy as np
+from utils import load_transactions
 
 def train_inventory_model(data_path='data/DimSumDelight_Full.csv'):
     """Train inventory prediction model with proper feature handling"""
     
-    # Load the original data to get item prices
-    df = pd.read_csv(data_path)
+    # Load the original data to get item prices (only the columns used here)
+    df = load_transactions(data_path, columns=['item_id', 'item_name', 'cuisine_tag', 'order_id',
+                                               'item_price', 'order_time'])
     
     # Create item demand dataset with price information
-    item_demand = df.groupby(['item_id', 'item_name', 'cuisine_tag']).agg({
-        'order_id': 'count',
-        'item_price': 'mean',  # Add average price per item
-        'order_time': lambda x: pd.to_datetime(x).dt.dayofweek.mode()[0],
-        'order_time': lambda x: pd.to_datetime(x).dt.hour.mode()[0]
-    }).reset_index()
-    
-    # Rename columns for clarity
-    item_demand = item_demand.rename(columns={
-        'order_id': 'demand_count',
-        '<lambda_0>': 'most_common_day',
-        '<lambda_1>': 'most_common_hour'
-    })
+    item_demand = df.groupby(['item_id', 'item_name', 'cuisine_tag'], observed=True).agg(
+        demand_count=('order_id', 'count'),
+        item_price=('item_price', 'mean'),  # Add average price per item
+        most_common_day=('order_time', lambda x: x.dt.dayofweek.mode()[0]),
+        most_common_hour=('order_time', lambda x: x.dt.hour.mode()[0])
+    ).reset_index()
     
     # Features and target
     features = ['cuisine_tag', 'most_common_day', 'most_common_hour', 'item_price']
@@ -1,27 +1,19 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime
 import os
+from utils import load_transactions
 
 def load_and_clean_data(filepath='data/DimSumDelight_Full.csv'):
     """Load and clean the raw dataset"""
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"Dataset not found at {filepath}")
     
-    df = pd.read_csv(filepath)
-    
-    # Remove duplicate columns
-    df = df.loc[:, ~df.columns.duplicated()]
-    
-    # Convert datetime columns
-    datetime_cols = ['order_time', 'driver_arrival_time', 'driver_pickup_time', 'delivery_time']
-    for col in datetime_cols:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col])
+    # Typed store: duplicate columns dropped, datetime columns parsed, positive orders only
+    df = load_transactions(filepath, filters=[('order_value', '>', 0)])
     
     # Basic cleaning
     df = df.dropna(subset=['order_value', 'item_price'])
-    df = df[df['order_value'] > 0]
+
+    # Parquet partitions come back month by month; a stable order keeps seeded splits reproducible
+    df = df.sort_values(['order_time', 'order_id'], kind='stable', ignore_index=True)
     
     return df
 
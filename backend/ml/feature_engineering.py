@@ -1,71 +1,257 @@
+import argparse
+import hashlib
+import os
+import time
+import tracemalloc
+
 import pandas as pd
 import numpy as np
+import feature_store
+from feature_store import FeatureStore
 from utils import save_artifact
 
-def create_features(df):
-    """Create all engineered features"""
-    
+FEATURES_PATH = 'data/feature_engineered_data.parquet'
+
+# Compact dtypes for the engineered columns (all values fit; float32 keeps ~7 significant digits)
+FEATURE_DTYPES = {
+    'order_day_of_week': 'int8',
+    'order_hour': 'int8',
+    'order_month': 'int8',
+    'prep_time': 'float32',
+    'delivery_duration': 'float32',
+    'item_count': 'int16',
+    'price_per_item': 'float32',
+    'merchant_avg_order': 'float32',
+    'merchant_order_std': 'float32',
+    'merchant_avg_delivery': 'float32',
+    'time_since_last_order': 'float32',
+    'is_peak_hour': 'int8',
+    'is_weekend': 'int8',
+}
+# Low-cardinality text columns stored as categoricals
+CATEGORICAL_COLUMNS = ['merchant_id', 'merchant_name', 'cuisine_tag', 'item_name']
+
+
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def measure(function, df):
+    """Run function(df) and return (result, wall seconds, peak traced allocation in MB)"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        result = function(df)
+        elapsed = time.perf_counter() - start
+        return result, elapsed, tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def feature_code_version():
+    """Digest of the code that builds features; a store built by other code is rebuilt, not appended to"""
+    digest = hashlib.sha256()
+    for path in (__file__, feature_store.__file__):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def group_mode(df, keys, column):
+    """Most frequent `column` value per `keys` group, the smallest one on ties (like mode()[0])"""
+    counts = df.groupby(keys + [column], observed=True).size()
+    # Counts are sorted by value within each group, so idxmax picks the smallest of the tied values
+    modes = counts.groupby(level=list(range(len(keys))), observed=True).idxmax()
+    return pd.Series(pd.MultiIndex.from_tuples(modes.to_numpy()).get_level_values(-1), index=modes.index)
+
+
+def set_feature(df, column, values):
+    """Add an engineered column, downcast right away so the wide temporary is short-lived"""
+    df[column] = values.astype(FEATURE_DTYPES[column])
+
+
+def create_features(df, feature_store=None):
+    """Create all engineered features
+
+    With a FeatureStore, `df` is a batch of new rows: it is folded into the store
+    and the merchant stats and time_since_last_order come from the running
+    aggregates instead of from `df` alone.
+    """
+    if feature_store is not None:
+        # Folded as raw rows, before any column is added or re-encoded
+        time_since_last_order = feature_store.update(df).reindex(df.index).to_numpy()
+
+    # Items per order; counted before the copy below so the order_id hash table is freed first
+    item_count = df.groupby('order_id')['item_id'].transform('count').to_numpy()
+
+    # Shrink the text columns, then put rows in eater/time order once; columns below are added in place
+    df = df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df.columns})
+    order = np.lexsort((df['order_time'].to_numpy(), df['eater_id'].to_numpy()))
+    df = df.take(order).reset_index(drop=True)
+
     # Time features
+    set_feature(df, 'order_day_of_week', df['order_time'].dt.dayofweek)
+    set_feature(df, 'order_hour', df['order_time'].dt.hour)
+    set_feature(df, 'order_month', df['order_time'].dt.month)
+
+    # Delivery features
+    delivery_duration = (df['delivery_time'] - df['driver_pickup_time']).dt.total_seconds() / 60
+    set_feature(df, 'prep_time', (df['driver_pickup_time'] - df['order_time']).dt.total_seconds() / 60)
+    set_feature(df, 'delivery_duration', delivery_duration)
+
+    # Customer features
+    item_count = item_count[order]
+    set_feature(df, 'item_count', item_count)
+    set_feature(df, 'price_per_item', df['order_value'] / item_count)
+
+    if feature_store is not None:
+        merchant_stats = feature_store.merchant_frame()
+        merchant_ids = df['merchant_id'].astype(str)
+        for column in merchant_stats.columns:
+            set_feature(df, column, merchant_ids.map(merchant_stats[column]))
+        set_feature(df, 'time_since_last_order', pd.Series(time_since_last_order[order]).fillna(0))
+        add_indicators(df)
+        return df
+
+    # Merchant features, mapped onto the rows rather than merged in
+    merchant_stats = df.assign(delivery_duration=delivery_duration).groupby('merchant_id', observed=True).agg(
+        merchant_avg_order=('order_value', 'mean'),
+        merchant_order_std=('order_value', 'std'),
+        merchant_avg_delivery=('delivery_duration', 'mean')
+    )
+    del delivery_duration
+    for column in merchant_stats.columns:
+        set_feature(df, column, df['merchant_id'].map(merchant_stats[column]).astype('float64'))
+
+    # Time since last order (rows are already in eater/time order)
+    set_feature(df, 'time_since_last_order',
+                (df.groupby('eater_id')['order_time'].diff().dt.total_seconds() / 3600).fillna(0))
+
+    add_indicators(df)
+    return df
+
+
+def add_indicators(df):
+    """Business indicators"""
+    set_feature(df, 'is_peak_hour', (df['order_hour'] >= 11) & (df['order_hour'] <= 14))
+    set_feature(df, 'is_weekend', df['order_day_of_week'] >= 5)
+
+def create_item_demand_dataset(df):
+    """Create dataset for inventory prediction"""
+    keys = ['item_id', 'item_name', 'cuisine_tag']
+    item_demand = df.groupby(keys, observed=True).agg(order_id=('order_id', 'count'))
+    item_demand['order_day_of_week'] = group_mode(df, keys, 'order_day_of_week')
+    item_demand['order_hour'] = group_mode(df, keys, 'order_hour')
+    item_demand = item_demand.reset_index()
+    item_demand.rename(columns={'order_id': 'demand_count'}, inplace=True)
+    return item_demand
+
+def create_customer_dataset(df):
+    """Create dataset for customer segmentation"""
+    customer_data = df.groupby('eater_id').agg({
+        'order_value': ['sum', 'mean', 'count'],
+        'delivery_duration': 'mean',
+        'time_since_last_order': 'mean',
+        'merchant_id': 'nunique'
+    }).reset_index()
+    customer_data.columns = ['eater_id', 'total_spent', 'avg_order_value',
+                           'order_count', 'avg_delivery_time',
+                           'avg_time_between_orders', 'unique_merchants']
+    return customer_data
+
+# Previous (pre-vectorization) feature pass, kept only as the baseline for --compare
+def legacy_feature_pass(df):
+    df = df.copy()
     df['order_day_of_week'] = df['order_time'].dt.dayofweek
     df['order_hour'] = df['order_time'].dt.hour
     df['order_month'] = df['order_time'].dt.month
-    
-    # Delivery features
     df['prep_time'] = (df['driver_pickup_time'] - df['order_time']).dt.total_seconds() / 60
     df['delivery_duration'] = (df['delivery_time'] - df['driver_pickup_time']).dt.total_seconds() / 60
-    
-    # Customer features
     df['item_count'] = df.groupby('order_id')['item_id'].transform('count')
     df['price_per_item'] = df['order_value'] / df['item_count']
-    
-    # Merchant features
-    merchant_stats = df.groupby('merchant_id').agg({
+    merchant_stats = df.groupby('merchant_id', observed=True).agg({
         'order_value': ['mean', 'std'],
         'delivery_duration': 'mean'
     }).reset_index()
     merchant_stats.columns = ['merchant_id', 'merchant_avg_order', 'merchant_order_std', 'merchant_avg_delivery']
     df = pd.merge(df, merchant_stats, on='merchant_id', how='left')
-    
-    # Time since last order
     df = df.sort_values(['eater_id', 'order_time'])
-    df['time_since_last_order'] = df.groupby('eater_id')['order_time'].diff().dt.total_seconds() / 3600
-    df['time_since_last_order'].fillna(0, inplace=True)
-    
-    # Business indicators
+    df['time_since_last_order'] = (df.groupby('eater_id')['order_time'].diff().dt.total_seconds() / 3600).fillna(0)
     df['is_peak_hour'] = ((df['order_hour'] >= 11) & (df['order_hour'] <= 14)).astype(int)
     df['is_weekend'] = (df['order_day_of_week'] >= 5).astype(int)
-    
-    return df
-
-def create_item_demand_dataset(df):
-    """Create dataset for inventory prediction"""
-    item_demand = df.groupby(['item_id', 'item_name', 'cuisine_tag']).agg({
+    item_demand = df.groupby(['item_id', 'item_name', 'cuisine_tag'], observed=True).agg({
         'order_id': 'count',
         'order_day_of_week': lambda x: x.mode()[0],
         'order_hour': lambda x: x.mode()[0]
     }).reset_index()
-    item_demand.rename(columns={'order_id': 'demand_count'}, inplace=True)
-    return item_demand
+    return df, item_demand, create_customer_dataset(df)
+
+
+def feature_pass(df, feature_store=None, previous=None):
+    """Engineered rows plus the item demand and customer datasets built from them
+
+    With a feature store, only rows it has not folded in yet are engineered and
+    appended to `previous` (the earlier engineered rows, which keep the merchant
+    stats they were built with).
+    """
+    if feature_store is None:
+        df = create_features(df)
+    else:
+        batch = feature_store.new_rows(df)
+        df = create_features(batch, feature_store) if len(batch) or previous is None else previous.iloc[:0]
+        if previous is not None:
+            df = pd.concat([previous, df], ignore_index=True)
+            # Concatenating categoricals with different categories falls back to object
+            df = df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df.columns})
+    return df, create_item_demand_dataset(df), create_customer_dataset(df)
 
-def create_customer_dataset(df):
-    """Create dataset for customer segmentation"""
-    customer_data = df.groupby('eater_id').agg({
-        'order_value': ['sum', 'mean', 'count'],
-        'delivery_duration': 'mean',
-        'time_since_last_order': 'mean',
-        'merchant_id': 'nunique'
-    }).reset_index()
-    customer_data.columns = ['eater_id', 'total_spent', 'avg_order_value', 
-                           'order_count', 'avg_delivery_time', 
-                           'avg_time_between_orders', 'unique_merchants']
-    return customer_data
 
 if __name__ == "__main__":
-    df = pd.read_parquet('data/processed_data.parquet')
-    df = create_features(df)
-    item_demand = create_item_demand_dataset(df)
-    customer_data = create_customer_dataset(df)
-    
-    save_artifact(df, 'data/feature_engineered_data.parquet')
+    parser = argparse.ArgumentParser(description="Build the engineered feature datasets")
+    parser.add_argument("--input", default='data/processed_data.parquet')
+    parser.add_argument("--compare", action="store_true",
+                        help="Also time the previous implementation and report before/after figures")
+    parser.add_argument("--feature-store", metavar="PATH",
+                        help="Fold only rows this store has not seen and append them to the existing features")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="With --feature-store, start from an empty store and rebuild every feature row")
+    args = parser.parse_args()
+
+    df = pd.read_parquet(args.input)
+    store = previous = None
+    if args.feature_store:
+        store = FeatureStore.load(args.feature_store)
+        version = feature_code_version()
+        if args.rebuild:
+            reason = "--rebuild"
+        elif store.rows.empty or not os.path.exists(FEATURES_PATH):
+            reason = "no earlier features"
+        elif store.version != version:
+            reason = "feature code changed"
+        elif store.changed(df):
+            reason = "rows already folded in changed"
+        else:
+            reason = None
+            previous = pd.read_parquet(FEATURES_PATH)
+        if reason:
+            print(f"Rebuilding the feature store: {reason}")
+            store = FeatureStore(version)
+
+    print(f"Input: {len(df)} rows, frame {frame_memory_mb(df):.2f} MB")
+    if args.compare:
+        (before_df, _, _), seconds, peak_mb = measure(legacy_feature_pass, df)
+        print(f"Before: {seconds:.2f}s, peak allocations {peak_mb:.2f} MB, frame {frame_memory_mb(before_df):.2f} MB")
+        del before_df
+    (df, item_demand, customer_data), seconds, peak_mb = measure(
+        lambda frame: feature_pass(frame, store, previous), df)
+    print(f"{'After' if args.compare else 'Feature pass'}: {seconds:.2f}s, peak allocations {peak_mb:.2f} MB, "
+          f"frame {frame_memory_mb(df):.2f} MB")
+
+    save_artifact(df, FEATURES_PATH)
     save_artifact(item_demand, 'data/item_demand_data.parquet')
-    save_artifact(customer_data, 'data/customer_data.parquet')
\ No newline at end of file
+    save_artifact(customer_data, 'data/customer_data.parquet')
+    if store is not None:
+        # Saved last, so a failed run folds the same rows again next time
+        store.save(args.feature_store)
+        print(f"Feature store: {int(store.rows['row_count'].sum())} rows, watermark {store.watermark}")
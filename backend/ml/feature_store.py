@@ -0,0 +1,191 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from utils import load_artifact, save_artifact
+
+FEATURE_STORE_PATH = 'models/feature_store.pkl'
+MERCHANT_STATE_COLUMNS = ['order_count', 'order_mean', 'order_m2', 'delivery_count', 'delivery_mean']
+ROW_KEY = ['order_id', 'item_id']  # Identifies a transaction row; an order's items may arrive in separate batches
+
+
+def row_keys(df):
+    return pd.util.hash_pandas_object(df[ROW_KEY], index=False).to_numpy()
+
+
+def row_fingerprints(df, keys=None):
+    """Per hashed ROW_KEY: the number of rows and the (wrapping) sum of their content hashes"""
+    keys = row_keys(df) if keys is None else keys
+    grouped = pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy()).groupby(keys)
+    return pd.DataFrame({'row_count': grouped.size(), 'row_digest': grouped.sum()})
+
+
+class FeatureStore:
+    """Running merchant and eater aggregates, updated from new order batches.
+
+    Per merchant it keeps the count, mean and sum of squared deviations (M2) of
+    order_value and the mean delivery duration, over transaction rows as
+    create_features does. A batch is reduced per merchant and merged into the
+    running values with the parallel form of Welford's update, so an update
+    costs O(batch) and never rescans history. Per eater it keeps the time of
+    the latest order.
+
+    Folded rows are fingerprinted per (order_id, item_id), so new_rows drops
+    anything already counted, including late rows older than `watermark` (the
+    latest order_time seen), and changed() tells when rows already folded in
+    were corrected and the store has to be rebuilt. `version` is whatever the
+    caller uses to tell its feature code apart; a store built by other code is
+    rebuilt too.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.merchants = pd.DataFrame(columns=MERCHANT_STATE_COLUMNS, dtype='float64')
+        self.merchants.index.name = 'merchant_id'
+        self.last_order_time = {}  # eater_id -> Timestamp
+        self.watermark = None
+        self.rows = row_fingerprints(pd.DataFrame(columns=ROW_KEY))
+
+    @classmethod
+    def load(cls, path=FEATURE_STORE_PATH):
+        """The persisted store, or an empty one if there is none yet"""
+        store = cls()
+        if os.path.exists(path):
+            state = load_artifact(path)
+            store.merchants = state['merchants']
+            store.last_order_time = state['last_order_time']
+            store.watermark = state['watermark']
+            store.version = state.get('version')
+            if 'rows' in state:
+                store.rows = state['rows']
+        return store
+
+    def save(self, path=FEATURE_STORE_PATH):
+        # Plain state rather than the object, so loading does not depend on how this module was run
+        save_artifact({'merchants': self.merchants, 'last_order_time': self.last_order_time,
+                       'watermark': self.watermark, 'rows': self.rows, 'version': self.version}, path)
+
+    def _folded(self, df):
+        """Keys of `df` and whether each row was folded in: the first row_count rows of its key"""
+        keys = row_keys(df)
+        occurrence = pd.Series(keys).groupby(keys).cumcount().to_numpy()
+        folded = self.rows['row_count'].reindex(keys, fill_value=0).to_numpy()
+        return keys, occurrence < folded
+
+    def new_rows(self, df):
+        """Rows of `df` not folded into the store yet, matched on (order_id, item_id)"""
+        if self.rows.empty:
+            return df
+        _, folded = self._folded(df)
+        return df[~folded]
+
+    def changed(self, df):
+        """Whether rows folded in before are missing from `df` or have other contents there"""
+        keys, folded = self._folded(df)
+        current = row_fingerprints(df[folded], keys[folded])
+        seen = self.rows.loc[self.rows.index.intersection(np.unique(keys))]
+        return not current.reindex(seen.index).equals(seen)
+
+    def update(self, batch):
+        """Fold a batch of raw transaction rows in and return its time_since_last_order (hours)"""
+        self.rows = pd.concat([self.rows, row_fingerprints(batch)]).groupby(level=0).sum()
+        batch = batch.dropna(subset=['order_time'])
+        if batch.empty:
+            return pd.Series(dtype='float64')
+        self._update_merchants(batch)
+        time_since_last_order = self._update_eaters(batch)
+        batch_end = batch['order_time'].max()
+        self.watermark = batch_end if self.watermark is None else max(self.watermark, batch_end)
+        return time_since_last_order
+
+    def _update_merchants(self, batch):
+        delivery_duration = (batch['delivery_time'] - batch['driver_pickup_time']).dt.total_seconds() / 60
+        grouped = batch.assign(delivery_duration=delivery_duration, merchant_id=batch['merchant_id'].astype(str))
+        stats = grouped.groupby('merchant_id').agg(
+            n=('order_value', 'count'),
+            mean=('order_value', 'mean'),
+            var=('order_value', 'var'),
+            delivery_n=('delivery_duration', 'count'),
+            delivery_mean=('delivery_duration', 'mean'),
+        )
+        old = self.merchants.reindex(stats.index, fill_value=0.0)
+
+        # Chan et al.'s pairwise combination of (count, mean, M2)
+        n = old['order_count'] + stats['n']
+        delta = stats['mean'] - old['order_mean']
+        merged = pd.DataFrame(index=stats.index)
+        merged['order_count'] = n
+        merged['order_mean'] = old['order_mean'] + delta * stats['n'] / n
+        merged['order_m2'] = (old['order_m2'] + stats['var'].fillna(0) * (stats['n'] - 1)
+                              + delta ** 2 * old['order_count'] * stats['n'] / n)
+        delivery_n = old['delivery_count'] + stats['delivery_n']
+        merged['delivery_count'] = delivery_n
+        merged['delivery_mean'] = np.where(
+            stats['delivery_n'] > 0,
+            old['delivery_mean'] + (stats['delivery_mean'] - old['delivery_mean']) * stats['delivery_n']
+            / delivery_n.where(delivery_n > 0, 1),
+            old['delivery_mean'])
+
+        self.merchants = pd.concat([self.merchants.drop(index=stats.index, errors='ignore'), merged])
+
+    def _update_eaters(self, batch):
+        rows = batch[['eater_id', 'order_time']].sort_values(['eater_id', 'order_time'], kind='stable')
+        previous = rows.groupby('eater_id')['order_time'].shift()
+        # An eater's first row in the batch continues from its last stored order
+        first = previous.isna()
+        stored = rows.loc[first, 'eater_id'].map(self.last_order_time)
+        previous = previous.where(~first, pd.to_datetime(stored))
+        hours = ((rows['order_time'] - previous).dt.total_seconds() / 3600).fillna(0)
+
+        latest = rows.groupby('eater_id')['order_time'].max()
+        for eater_id, order_time in latest.items():
+            if eater_id not in self.last_order_time or order_time > self.last_order_time[eater_id]:
+                self.last_order_time[eater_id] = order_time
+        return hours.reindex(batch.index)
+
+    def merchant_features(self, merchant_id):
+        """merchant_avg_order, merchant_order_std and merchant_avg_delivery, or None if unseen"""
+        if merchant_id not in self.merchants.index:
+            return None
+        state = self.merchants.loc[merchant_id]
+        count = state['order_count']
+        return {
+            'merchant_avg_order': float(state['order_mean']),
+            'merchant_order_std': float(np.sqrt(state['order_m2'] / (count - 1))) if count > 1 else np.nan,
+            'merchant_avg_delivery': float(state['delivery_mean']) if state['delivery_count'] > 0 else np.nan,
+        }
+
+    def merchant_frame(self):
+        """merchant_features for every merchant, indexed by merchant_id"""
+        merchants = self.merchants
+        count = merchants['order_count']
+        return pd.DataFrame({
+            'merchant_avg_order': merchants['order_mean'],
+            'merchant_order_std': np.sqrt(merchants['order_m2'] / (count - 1).where(count > 1)),
+            'merchant_avg_delivery': merchants['delivery_mean'].where(merchants['delivery_count'] > 0),
+        })
+
+    def time_since_last_order(self, eater_id, order_time):
+        """Hours between `order_time` and the eater's latest stored order (0 for a first order)"""
+        last = self.last_order_time.get(eater_id)
+        if last is None:
+            return 0.0
+        return (pd.Timestamp(order_time) - last).total_seconds() / 3600
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold new transactions into the online feature store")
+    parser.add_argument("--input", default='data/processed_data.parquet')
+    parser.add_argument("--store", default=FEATURE_STORE_PATH)
+    args = parser.parse_args()
+
+    store = FeatureStore.load(args.store)
+    df = pd.read_parquet(args.input)
+    if store.changed(df):
+        parser.exit(1, "Rows already in the store have changed; rebuild it with feature_engineering.py --rebuild\n")
+    batch = store.new_rows(df)
+    store.update(batch)
+    store.save(args.store)
+    print(f"Folded {len(batch)} new rows; {len(store.merchants)} merchants, "
+          f"{len(store.last_order_time)} eaters, watermark {store.watermark}")
@@ -0,0 +1,182 @@
+import argparse
+import hashlib
+import json
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, NamedTuple, Tuple
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(ML_DIR)
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+
+from transaction_store import MANIFEST_NAME, TransactionStore
+
+PIPELINE_STATE_PATH = 'models/pipeline_state.json'
+FEATURE_STORE_PATH = 'models/feature_store.pkl'
+RAW_TRANSACTIONS_PATH = 'data/DimSumDelight_Full.csv'
+# Written last by every conversion of the store the ML stages read (see transaction_store.py)
+TRANSACTION_STORE_MANIFEST = os.path.relpath(
+    os.path.join(TransactionStore(RAW_TRANSACTIONS_PATH).store_dir, MANIFEST_NAME))
+PIPELINE_WORKERS = min(4, os.cpu_count() or 1)
+# Shared code every stage runs through; a change to it reruns everything
+SHARED_CODE = [os.path.join(ML_DIR, 'utils.py'), os.path.join(BACKEND_DIR, 'transaction_store.py')]
+
+
+class Stage(NamedTuple):
+    name: str
+    script: str  # Relative to ml/; run as __main__ with paths relative to the working directory
+    inputs: List[str]
+    outputs: List[str]
+    args: Tuple[str, ...] = ()  # Command-line arguments for the script
+    force_args: Tuple[str, ...] = ()  # Extra arguments under --force, e.g. to drop incremental state
+
+
+# Stages in dependency order; a stage depends on the stages producing its inputs.
+# The CSV is converted once up front, so stages reading it in parallel never convert it concurrently.
+STAGES = [
+    Stage('convert', os.path.join('..', 'transaction_store.py'),
+          [RAW_TRANSACTIONS_PATH], [TRANSACTION_STORE_MANIFEST]),
+    Stage('data_preparation', 'data_preparation.py',
+          [TRANSACTION_STORE_MANIFEST], ['data/processed_data.parquet']),
+    # Folds only new orders into the feature store and appends their rows to the existing features
+    Stage('feature_engineering', 'feature_engineering.py',
+          ['data/processed_data.parquet'],
+          ['data/feature_engineered_data.parquet', 'data/item_demand_data.parquet', 'data/customer_data.parquet',
+           FEATURE_STORE_PATH],
+          ('--feature-store', FEATURE_STORE_PATH), ('--rebuild',)),
+    Stage('sales_forecasting', 'Sales_Forecasting.py',
+          ['data/feature_engineered_data.parquet'], ['models/sales_forecasting_model.pkl']),
+    Stage('delivery_time', 'Delivery_Time_Prediction.py',
+          ['data/feature_engineered_data.parquet'], ['models/delivery_time_model.pkl']),
+    Stage('reorder', 'Reorder_Prediction.py',
+          ['data/feature_engineered_data.parquet'], ['models/reorder_model.pkl']),
+    Stage('customer_segmentation', 'Customer_Segmentation.py',
+          ['data/customer_data.parquet'],
+          ['data/customer_segments.parquet', 'models/customer_segmentation_model.pkl', 'reports/elbow_plot.png']),
+    Stage('inventory', 'Inventory_Prediction.py', [TRANSACTION_STORE_MANIFEST], []),
+]
+
+
+def load_state(path=PIPELINE_STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'stages': {}, 'digests': {}}
+
+
+def save_state(state, path=PIPELINE_STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def file_digest(path, digests):
+    """Content hash of `path`, re-read only when its size or mtime changed since the last run"""
+    stat = os.stat(path)
+    cached = digests.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digests[path] = [stat.st_size, stat.st_mtime, digest.hexdigest()]
+    return digests[path][2]
+
+
+def stage_fingerprint(stage, digests):
+    """Hash of the stage's input files and code, or None if an input is missing"""
+    fingerprint = hashlib.sha256(repr(stage.args).encode())
+    for path in stage.inputs + [os.path.join(ML_DIR, stage.script)] + SHARED_CODE:
+        if not os.path.exists(path):
+            return None
+        fingerprint.update(f"{path}:{file_digest(path, digests)}\n".encode())
+    return fingerprint.hexdigest()
+
+
+def run_stage(script, args=()):
+    """Run one stage script in this (worker) process and return its wall time"""
+    sys.argv = [script, *args]
+    if ML_DIR not in sys.path:
+        sys.path.insert(0, ML_DIR)
+    start = time.perf_counter()
+    runpy.run_path(os.path.join(ML_DIR, script), run_name='__main__')
+    return time.perf_counter() - start
+
+
+def run_pipeline(stages=STAGES, force=False, workers=PIPELINE_WORKERS, state_path=PIPELINE_STATE_PATH):
+    """Run the stages whose inputs or code changed, independent ones in parallel.
+
+    Returns {stage name: (status, seconds)}, status being "ran", "cached",
+    "failed" or "skipped" (an upstream stage failed or an input is missing).
+    """
+    state = load_state(state_path)
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    upstream = {stage.name: {producers[path] for path in stage.inputs if path in producers} for stage in stages}
+    results = {}
+    pending = {}  # future -> (stage, fingerprint)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while len(results) < len(stages):
+            for stage in stages:
+                running = [name for name, _ in pending.values()]
+                if stage.name in results or stage.name in running:
+                    continue
+                if not all(name in results for name in upstream[stage.name]):
+                    continue
+                if any(results[name][0] in ('failed', 'skipped') for name in upstream[stage.name]):
+                    results[stage.name] = ('skipped', 0.0)
+                    continue
+                # Fingerprinted once its upstream stages are done, so their fresh outputs count
+                fingerprint = stage_fingerprint(stage, state['digests'])
+                if fingerprint is None:
+                    results[stage.name] = ('skipped', 0.0)
+                    print(f"[{stage.name}] skipped: missing input")
+                elif (not force and state['stages'].get(stage.name) == fingerprint
+                      and all(os.path.exists(path) for path in stage.outputs)):
+                    results[stage.name] = ('cached', 0.0)
+                else:
+                    print(f"[{stage.name}] running {stage.script}")
+                    args = stage.args + (stage.force_args if force else ())
+                    pending[pool.submit(run_stage, stage.script, args)] = (stage.name, fingerprint)
+            if not pending:
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint = pending.pop(future)
+                try:
+                    results[name] = ('ran', future.result())
+                    state['stages'][name] = fingerprint
+                except BaseException as e:
+                    results[name] = ('failed', 0.0)
+                    print(f"[{name}] failed: {e!r}")
+            save_state(state, state_path)
+
+    save_state(state, state_path)
+    return {stage.name: results[stage.name] for stage in stages}
+
+
+def print_report(results, elapsed):
+    print(f"\n{'stage':<24}{'status':<10}{'seconds':>10}")
+    for name, (status, seconds) in results.items():
+        print(f"{name:<24}{status:<10}{seconds:>10.2f}")
+    print(f"{'total wall time':<34}{elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ML pipeline, skipping up-to-date stages")
+    parser.add_argument("--force", action="store_true", help="Rerun every stage")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_pipeline(force=args.force, workers=args.workers)
+    print_report(results, time.perf_counter() - start)
+    sys.exit(1 if any(status == 'failed' for status, _ in results.values()) else 0)
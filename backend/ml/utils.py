@@ -1,6 +1,14 @@
 import joblib
 import pandas as pd
 import os
+import sys
+
+# Shared backend modules (e.g. transaction_store) live one level up
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+
+from transaction_store import TransactionStore
 
 def save_artifact(obj, filepath):
     """Save any Python object to disk"""
@@ -17,4 +25,8 @@ def load_artifact(filepath):
         return joblib.load(filepath)
     elif filepath.endswith('.parquet'):
         return pd.read_parquet(filepath)
-    raise ValueError("Unsupported file format")
\ No newline at end of file
+    raise ValueError("Unsupported file format")
+
+def load_transactions(csv_path='data/DimSumDelight_Full.csv', columns=None, months=None, filters=None):
+    """Load typed transactions through the shared Parquet store, converting the CSV on first use"""
+    return TransactionStore(csv_path).read(columns=columns, months=months, filters=filters)
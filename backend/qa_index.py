@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+
+import faiss
+import numpy as np
+
+from vector_index import normalize_rows
+
+QA_PAIRS_PATH = "data/qa_pairs.json"
+VECTOR_DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "vector_db")
+QA_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+QA_INDEX_FORMAT = 2  # Bump when the artifact layout changes to force a rebuild
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Load the sentence-transformer on first use instead of at import time"""
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            _embedding_model = SentenceTransformer(QA_EMBEDDING_MODEL)
+    return _embedding_model
+
+
+def format_qa_text(item: dict) -> str:
+    return f"Q: {item['question']} A: {item['answer']}"
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class QAIndex:
+    """FAISS index over qa_pairs.json, prebuilt on disk and loaded lazily.
+
+    Artifacts are named after a hash of the QA file, embedding model and format,
+    so the pairs are only re-embedded when one of those changes.
+    """
+
+    def __init__(self, qa_path: str = QA_PAIRS_PATH, index_dir: str = VECTOR_DB_DIR):
+        self.qa_path = qa_path
+        self.index_dir = index_dir
+        self.version = None
+        self._loaded = None  # (faiss index, texts, answers), swapped together on reload
+        self._qa_mtime = None
+        self._lock = threading.Lock()
+
+    def current_version(self) -> str:
+        digest = hashlib.sha256(f"{file_hash(self.qa_path)}:{QA_EMBEDDING_MODEL}:{QA_INDEX_FORMAT}".encode())
+        return digest.hexdigest()[:16]
+
+    def artifact_paths(self, version: str):
+        prefix = os.path.join(self.index_dir, f"qa_pairs-{version}")
+        return prefix + ".index", prefix + ".json"
+
+    def build(self, version: str = None):
+        """Embed every QA pair and write the index and texts for `version`"""
+        version = version or self.current_version()
+        with open(self.qa_path, "r") as f:
+            qa_data = json.load(f)
+        texts = [format_qa_text(item) for item in qa_data]
+        answers = [item["answer"] for item in qa_data]
+        # Embed the questions alone so a rephrased question scores close to 1
+        embeddings = normalize_rows(get_embedding_model().encode([item["question"] for item in qa_data]))
+
+        # Inner product over unit vectors, so search scores are cosine similarities
+        index = faiss.IndexFlatIP(embeddings.shape[1])
+        index.add(embeddings)
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        index_path, texts_path = self.artifact_paths(version)
+        # Write under temporary names first so a half-written artifact is never loaded
+        faiss.write_index(index, index_path + ".tmp")
+        with open(texts_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": version, "model": QA_EMBEDDING_MODEL, "texts": texts, "answers": answers}, f)
+        os.replace(index_path + ".tmp", index_path)
+        os.replace(texts_path + ".tmp", texts_path)
+
+        # Remove artifacts of older QA versions
+        for name in os.listdir(self.index_dir):
+            if name.startswith("qa_pairs-") and version not in name:
+                os.remove(os.path.join(self.index_dir, name))
+        print(f"Built QA index {version} with {len(texts)} pairs")
+        return index_path, texts_path
+
+    def ensure_loaded(self):
+        """Load on first use, and again only if qa_pairs.json changed on disk"""
+        mtime = os.path.getmtime(self.qa_path)
+        if self._loaded is not None and mtime == self._qa_mtime:
+            return
+        with self._lock:
+            if self._loaded is not None and mtime == self._qa_mtime:
+                return
+            version = self.current_version()
+            if version != self.version:
+                index_path, texts_path = self.artifact_paths(version)
+                if not (os.path.exists(index_path) and os.path.exists(texts_path)):
+                    self.build(version)
+                with open(texts_path, encoding="utf-8") as f:
+                    artifact = json.load(f)
+                self._loaded = (faiss.read_index(index_path), artifact["texts"], artifact["answers"])
+                self.version = version
+            self._qa_mtime = mtime
+
+    def search(self, query_embedding: np.ndarray, k: int = 3):
+        """Return the k QA pairs with the most similar questions as (cosine similarity, text, stored answer), best first"""
+        self.ensure_loaded()
+        index, texts, answers = self._loaded
+        scores, ids = index.search(normalize_rows(query_embedding).reshape(1, -1), k)
+        return [(float(score), texts[i], answers[i]) for score, i in zip(scores[0], ids[0]) if i >= 0]
+
+
+# Offline builder: python qa_index.py
+if __name__ == "__main__":
+    QAIndex().build()
@@ -1,56 +1,127 @@
 import os
 import json
-import faiss
-import numpy as np
+import time
+import hashlib
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 import google.generativeai as genai
+from embedding_cache import query_embedding_cache
+from qa_index import QAIndex, get_embedding_model
+from domain_router import DomainRouter
+from conversation_memory import ConversationMemory
+from answer_cache import SemanticAnswerCache, writing_script
 
 # Load .env variables
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
 genai.configure(api_key=API_KEY)
 
-# Load QA pairs
-with open("data/qa_pairs.json", "r") as f:
-    qa_data = json.load(f)
+GENERATION_MODEL = "gemini-2.0-flash"
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "32"))  # Concurrent RAG calls per worker
+RAG_WORKER_THREADS = int(os.getenv("RAG_WORKER_THREADS", "4"))  # Threads for embedding + FAISS search
+RAG_SUMMARIZE_HISTORY = os.getenv("RAG_SUMMARIZE_HISTORY", "false").lower() == "true"  # Summarize old turns
+QA_DIRECT_THRESHOLD = float(os.getenv("QA_DIRECT_THRESHOLD", "0.85"))  # Return the stored QA answer above this
+QA_ESCALATE_THRESHOLD = float(os.getenv("QA_ESCALATE_THRESHOLD", "0.4"))  # Refer to support staff below this
+SUPPORT_URL = os.getenv("SUPPORT_URL", "/customer-service")
+ESCALATION_MESSAGE = (
+    "I'm sorry, I couldn't find a reliable answer to your question. "
+    f"Please consult our support staff at {SUPPORT_URL} for further assistance."
+)
 
-qa_texts = [f"Q: {item['question']} A: {item['answer']}" for item in qa_data]
+generation_model = genai.GenerativeModel(GENERATION_MODEL)
 
-# Generate embeddings
-model = SentenceTransformer("all-MiniLM-L6-v2")
-qa_embeddings = model.encode(qa_texts)
+# QA pairs index: prebuilt by `python qa_index.py`, loaded on the first query
+qa_index = QAIndex()
 
-# Setup FAISS
-dimension = qa_embeddings.shape[1]
-index = faiss.IndexFlatL2(dimension)
-index.add(np.array(qa_embeddings))
+# Domain indexes shipped in vector_db/ (customer service, marketing, ...), loaded once
+domain_router = DomainRouter()
 
-# Initialize chat history
-chat_history = []
+# CPU-bound retrieval runs here so async handlers never block the event loop
+retrieval_executor = ThreadPoolExecutor(max_workers=RAG_WORKER_THREADS, thread_name_prefix="rag")
+rag_semaphore = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+
+
+def summarize_history(summary, turns):
+    """Fold evicted turns into a chat's rolling summary with a short Gemini call"""
+    transcript = "\n".join(f"User: {q}\nAssistant: {a}" for q, a in turns)
+    prompt = f"""Update the conversation summary with the new turns. Keep names, order numbers, items and
+decisions. Reply with the summary only, in at most 100 words.
+
+Current summary:
+{summary or "(none)"}
+
+New turns:
+{transcript}
+"""
+    return generation_model.generate_content(prompt).text.strip()
+
+
+# Chat history per chat_id, bounded by a token budget
+conversation_memory = ConversationMemory(summarizer=summarize_history if RAG_SUMMARIZE_HISTORY else None)
+
+# Gemini answers reused for near-duplicate questions
+answer_cache = SemanticAnswerCache()
+
+
+def embed_query(user_query):
+    # Generate embedding for the user query, reusing it for repeated questions
+    return query_embedding_cache.encode(get_embedding_model(), user_query, namespace="qa")
 
-# Query function
-def query_rag(user_query):
-    global chat_history  # Use the global chat history
 
-    # Generate embedding for the user query
-    query_embedding = model.encode([user_query])
-    D, I = index.search(np.array(query_embedding), k=3)
+def answer_scope(user_query, tone=None, history_context=""):
+    """Cached answers are only reused for the same tone, writing script and chat history.
 
-    # Retrieve top QA chunks
-    top_k_qa = [qa_texts[i] for i in I[0]]
-    context = "\n".join(top_k_qa)
+    Answers to a chat with history may build on it, so those are only shared
+    with a chat holding exactly the same (rendered) history.
+    """
+    history = hashlib.sha256(history_context.encode()).hexdigest()[:16] if history_context else "new"
+    return f"{tone or 'default'}:{writing_script(user_query)}:{history}"
 
-    # Include chat history in the context
-    history_context = "\n".join([f"User: {q}\nAssistant: {a}" for q, a in chat_history])
-    full_context = f"{history_context}\n\nContext:\n{context}"
+
+def retrieve(user_query):
+    """Embed the query and search the QA index and the routed domain indexes.
+
+    Returns (query_embedding, qa_hits, domain_hits); hits are best first and
+    carry cosine similarity scores.
+    """
+    query_embedding = embed_query(user_query)
+    qa_hits = qa_index.search(query_embedding, k=3)
+    domain_hits = domain_router.search(query_embedding, k=3)
+    return query_embedding, qa_hits, domain_hits
+
+
+def direct_answer(qa_hits, domain_hits, tone=None):
+    """Answer without the LLM when retrieval alone is decisive, else None"""
+    # A near-exact QA match already holds the full answer (text plus chart);
+    # a requested tone still needs the LLM to rephrase it
+    if tone is None and qa_hits and qa_hits[0][0] >= QA_DIRECT_THRESHOLD:
+        return json.dumps(qa_hits[0][2])
+    # Nothing relevant anywhere: escalate instead of letting the LLM guess
+    best_score = max([hit[0] for hit in qa_hits + domain_hits], default=0.0)
+    if best_score < QA_ESCALATE_THRESHOLD:
+        return ESCALATION_MESSAGE
+    return None
+
+
+def build_context(qa_hits, domain_hits):
+    """Context lines for the prompt, labelled with their similarity to the question"""
+    lines = [f"(similarity {score:.0%}) {text}" for score, text, _ in qa_hits]
+    lines += [f"(similarity {score:.0%}) [{domain}] {response}" for score, domain, response in domain_hits]
+    return "\n".join(lines)
+
+
+def build_prompt(user_query, context, history_context, tone=None):
+    # history_context is this chat's rendered recent history
+    if tone:
+        user_query += f"\nPlease respond in a {tone} tone."
 
     # Prompt with chat history
-    prompt = f"""
+    return f"""
 You are an intelligent assistant tasked with answering user questions based on the provided context and chat history. Follow these guidelines strictly:
 
 1. Always respond in the same language as the user's input. If the context is in English but the input is in another language, translate the response to match the input language.
-2. Use the vector database to find the most similar question-answer pair based on the user's query. If the similarity score is below 70%, inform the user to consult the support staff at this "url" in a professional tone.
+2. Each context entry is labelled with its similarity to the user's query. Base the answer on the most similar entries. If none of them is relevant, inform the user to consult the support staff at {SUPPORT_URL} in a professional tone.
 3. Provide concise and accurate answers without asking follow-up questions.
 4. Ensure the response is professional and easy to understand.
 
@@ -65,14 +136,70 @@ User Question: {user_query}
 Answer:
 """
 
-    # Use Gemini to generate the answer
-    generation_model = genai.GenerativeModel("gemini-2.0-flash")
-    response = generation_model.generate_content(prompt)
+
+# Query function
+def query_rag(user_query, chat_id="default", tone=None):
+    query_embedding, qa_hits, domain_hits = retrieve(user_query)
+    history_context = conversation_memory.render(chat_id)
+    scope = answer_scope(user_query, tone, history_context)
+
+    # Only the uncertain middle band goes to the LLM
+    answer = direct_answer(qa_hits, domain_hits, tone)
+    if answer is None:
+        answer = answer_cache.lookup(query_embedding, scope)
+    if answer is None:
+        prompt = build_prompt(user_query, build_context(qa_hits, domain_hits), history_context, tone)
+
+        # Use Gemini to generate the answer
+        started = time.perf_counter()
+        answer = generation_model.generate_content(prompt).text
+        answer_cache.store(query_embedding, answer, time.perf_counter() - started, scope)
 
     # Update chat history
-    chat_history.append((user_query, response.text))
+    conversation_memory.add_turn(chat_id, user_query, answer)
+
+    return answer
+
+
+async def query_rag_stream(user_query, chat_id="default", tone=None):
+    """Non-blocking query_rag that yields the answer in pieces as Gemini streams it.
+
+    Retrieval is offloaded to a bounded thread pool and Gemini is streamed through
+    its async client. Direct and cached answers arrive as a single piece. At most
+    RAG_MAX_CONCURRENCY calls run at once per worker.
+    """
+    async with rag_semaphore:
+        loop = asyncio.get_running_loop()
+        query_embedding, qa_hits, domain_hits = await loop.run_in_executor(retrieval_executor, retrieve, user_query)
+        history_context = conversation_memory.render(chat_id)
+        scope = answer_scope(user_query, tone, history_context)
+
+        # Only the uncertain middle band goes to the LLM
+        answer = direct_answer(qa_hits, domain_hits, tone)
+        if answer is None:
+            answer = answer_cache.lookup(query_embedding, scope)
+        if answer is not None:
+            yield answer
+        else:
+            prompt = build_prompt(user_query, build_context(qa_hits, domain_hits), history_context, tone)
+
+            started = time.perf_counter()
+            pieces = []
+            async for chunk in await generation_model.generate_content_async(prompt, stream=True):
+                pieces.append(chunk.text)
+                yield chunk.text
+            answer = "".join(pieces)
+            answer_cache.store(query_embedding, answer, time.perf_counter() - started, scope)
+
+        # May summarize evicted turns with a blocking LLM call, so keep it off the loop
+        await loop.run_in_executor(retrieval_executor, conversation_memory.add_turn,
+                                   chat_id, user_query, answer)
+
+
+async def query_rag_async(user_query, chat_id="default", tone=None):
+    """Non-blocking query_rag for async handlers that need the whole answer"""
+    return "".join([piece async for piece in query_rag_stream(user_query, chat_id, tone)])
 
-    return response.text
 
 # Interactive CLI
 if __name__ == "__main__":
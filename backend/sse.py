@@ -0,0 +1,70 @@
+import json
+import re
+
+# Keep proxies from buffering the stream and browsers from caching it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def sse_event(event: str, data) -> str:
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class AnswerTextStream:
+    """Pulls the "text" value out of a streamed {'text': ..., 'image': ...} answer.
+
+    Plain-text answers pass straight through. For dict-shaped answers only the
+    characters of the text value are released, as soon as they arrive; the full
+    raw answer stays in `raw` for parsing once the stream ends.
+    """
+
+    _TEXT_KEY = re.compile(r"""\s*\{\s*(['"])text\1\s*:\s*(['"])""")
+    _ESCAPES = {"n": "\n", "t": "\t"}
+
+    def __init__(self):
+        self.raw = ""
+        self._mode = None  # None until decided, then "plain", "field" or "done"
+        self._pos = 0  # Next unread index in raw
+        self._quote = None
+
+    def feed(self, piece: str) -> str:
+        """Add a chunk of the answer and return the newly readable text"""
+        self.raw += piece
+        if self._mode is None:
+            stripped = self.raw.lstrip()
+            if not stripped:
+                return ""
+            if not stripped.startswith("{"):
+                self._mode = "plain"
+            else:
+                match = self._TEXT_KEY.match(self.raw)
+                if match:
+                    self._mode, self._quote, self._pos = "field", match.group(2), match.end()
+                elif re.search(r":\s*\S", stripped):
+                    # Not a text-first dict; the final event carries the parsed answer
+                    self._mode = "done"
+                else:
+                    return ""  # The key may still be arriving
+
+        if self._mode == "plain":
+            text, self._pos = self.raw[self._pos:], len(self.raw)
+            return text
+        if self._mode == "field":
+            text = []
+            while self._pos < len(self.raw):
+                char = self.raw[self._pos]
+                if char == "\\":
+                    if self._pos + 1 == len(self.raw):
+                        break  # Wait for the escaped character
+                    escaped = self.raw[self._pos + 1]
+                    text.append(self._ESCAPES.get(escaped, escaped))
+                    self._pos += 2
+                    continue
+                if char == self._quote:
+                    self._mode = "done"
+                    break
+                text.append(char)
+                self._pos += 1
+            return "".join(text)
+        return ""
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+from uuid import uuid4
+
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.tseries.api import guess_datetime_format
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+RAW_TRANSACTIONS_PATH = "data/DimSumDelight_Full.csv"
+TRANSACTION_STORE_DIR = "data/parquet"  # One month-partitioned Parquet dataset per source CSV and parse options
+TRANSACTION_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+CONVERT_CHUNK_SIZE = 500_000  # CSV rows parsed at a time during conversion
+UNKNOWN_MONTH = "unknown"  # Partition for rows without a parseable order_time
+MANIFEST_NAME = "_manifest.json"
+LOCK_SUFFIX = ".lock"  # Sibling lock file serializing conversions across processes
+
+DATETIME_COLUMNS = ["order_time", "driver_arrival_time", "driver_pickup_time", "delivery_time"]
+CATEGORICAL_COLUMNS = ["merchant_id", "merchant_name", "cuisine_tag", "item_name"]
+# Explicit CSV dtypes; columns a file does not have are skipped. Integers are nullable,
+# so a blank cell reads as <NA> instead of failing the whole conversion.
+TRANSACTION_DTYPES = {
+    "merchant_id": "string",
+    "merchant_name": "string",
+    "join_date": "Int64",
+    "city_id": "Int64",
+    "item_id": "Int64",
+    "cuisine_tag": "string",
+    "item_name": "string",
+    "item_price": "float64",
+    "order_id": "string",
+    "order_value": "float64",
+    "eater_id": "Int64",
+}
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on `path` (created if missing), held across processes"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 seconds; keep waiting
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TransactionStore:
+    """Typed, month-partitioned Parquet copy of a raw transaction CSV.
+
+    The CSV is parsed once, with explicit dtypes and datetime format, into
+    `<store_dir>/month=YYYY-MM/*.parquet`, and converted again only when the CSV
+    changes. Reads load just the requested columns, skip months that are not
+    asked for and push `filters` down to the Parquet row groups. String columns
+    in CATEGORICAL_COLUMNS come back as categoricals.
+
+    Conversions hold a lock file next to the store, so concurrent processes
+    convert one at a time; each stages into its own directory and swaps it in
+    only after the written row count matches the CSV.
+    """
+
+    def __init__(self, csv_path: str = RAW_TRANSACTIONS_PATH, store_dir: Optional[str] = None,
+                 datetime_format: Optional[str] = TRANSACTION_DATETIME_FORMAT, dayfirst: bool = False):
+        self.csv_path = csv_path
+        self.datetime_format = datetime_format  # None guesses the format from the first order_time
+        self.dayfirst = dayfirst
+        if store_dir is None:
+            # Readers with different parse options (or same-named CSVs) get separate copies
+            # instead of reconverting over each other
+            name = os.path.splitext(os.path.basename(csv_path))[0]
+            options = json.dumps([os.path.abspath(csv_path), datetime_format, dayfirst]).encode()
+            store_dir = os.path.join(TRANSACTION_STORE_DIR, f"{name}-{hashlib.sha256(options).hexdigest()[:12]}")
+        self.store_dir = store_dir
+        self._lock = threading.Lock()
+
+    def _source_signature(self) -> dict:
+        stat = os.stat(self.csv_path)
+        return {"source": os.path.abspath(self.csv_path), "size": stat.st_size, "mtime": stat.st_mtime,
+                "datetime_format": self.datetime_format, "dayfirst": self.dayfirst}
+
+    def _manifest(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.store_dir, MANIFEST_NAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_current(self) -> bool:
+        manifest = self._manifest()
+        if manifest is None:
+            return False
+        if not os.path.exists(self.csv_path):
+            return True  # Only the converted copy is available
+        return manifest["signature"] == self._source_signature()
+
+    @contextmanager
+    def _conversion_lock(self):
+        with self._lock, file_lock(self.store_dir + LOCK_SUFFIX):
+            yield
+
+    def ensure_converted(self):
+        if self.is_current():
+            return
+        with self._conversion_lock():
+            if not self.is_current():
+                self._convert()
+
+    def guess_format(self, chunk: pd.DataFrame) -> Optional[str]:
+        """Datetime format of the first order_time in `chunk`, or None if there is none to guess from"""
+        if "order_time" not in chunk.columns:
+            return None
+        values = chunk["order_time"].dropna()
+        if values.empty:
+            return None
+        sample = str(values.iloc[0])
+        # dayfirst only applies to day/month-leading dates; it would read ISO dates as year-day-month
+        return guess_datetime_format(sample, dayfirst=self.dayfirst and not sample[:4].isdigit())
+
+    def parse_datetimes(self, values: pd.Series, datetime_format: Optional[str] = None) -> pd.Series:
+        datetime_format = datetime_format or self.datetime_format
+        if datetime_format:
+            return pd.to_datetime(values, format=datetime_format, errors="coerce")
+        return pd.to_datetime(values, dayfirst=self.dayfirst, errors="coerce")
+
+    def _prepare(self, chunk: pd.DataFrame, datetime_format: Optional[str] = None) -> pd.DataFrame:
+        chunk = chunk.loc[:, ~chunk.columns.duplicated()]
+        for column in DATETIME_COLUMNS:
+            if column in chunk.columns:
+                chunk[column] = self.parse_datetimes(chunk[column], datetime_format)
+        if "order_time" in chunk.columns:
+            chunk["month"] = chunk["order_time"].dt.strftime("%Y-%m").fillna(UNKNOWN_MONTH)
+        else:
+            chunk["month"] = UNKNOWN_MONTH
+        return chunk
+
+    def convert(self):
+        """Parse the CSV in chunks and write one Parquet file per (chunk, month)"""
+        with self._conversion_lock():
+            self._convert()
+
+    def _convert(self):
+        staging_dir = f"{self.store_dir}.tmp-{os.getpid()}-{uuid4().hex[:8]}"
+        try:
+            rows, months = self._write_staging(staging_dir)
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        # Swap the finished copy in so readers never see a half-written store
+        retired_dir = f"{self.store_dir}.old-{os.getpid()}-{uuid4().hex[:8]}"
+        if os.path.exists(self.store_dir):
+            os.replace(self.store_dir, retired_dir)
+        os.replace(staging_dir, self.store_dir)
+        shutil.rmtree(retired_dir, ignore_errors=True)
+        print(f"Converted {self.csv_path}: {rows} rows in {len(months)} months -> {self.store_dir}")
+
+    def _write_staging(self, staging_dir):
+        columns = pd.read_csv(self.csv_path, nrows=0).columns
+        dtypes = {column: dtype for column, dtype in TRANSACTION_DTYPES.items() if column in columns}
+
+        rows = 0
+        months = set()
+        stored_columns = list(columns[~columns.duplicated()])
+        datetime_format = self.datetime_format
+        for number, chunk in enumerate(pd.read_csv(self.csv_path, dtype=dtypes, chunksize=CONVERT_CHUNK_SIZE)):
+            # Without an explicit format, guess it once rather than inferring per value and chunk
+            datetime_format = datetime_format or self.guess_format(chunk)
+            chunk = self._prepare(chunk, datetime_format)
+            rows += len(chunk)
+            for month, part in chunk.groupby("month", sort=False):
+                months.add(month)
+                month_dir = os.path.join(staging_dir, f"month={month}")
+                os.makedirs(month_dir, exist_ok=True)
+                part.drop(columns="month").to_parquet(
+                    os.path.join(month_dir, f"part-{number:05d}.parquet"), index=False)
+
+        os.makedirs(staging_dir, exist_ok=True)
+        written = sum(pq.ParquetFile(os.path.join(root, name)).metadata.num_rows
+                      for root, _, names in os.walk(staging_dir) for name in names if name.endswith(".parquet"))
+        if written != rows:
+            raise RuntimeError(f"Converting {self.csv_path} wrote {written} of {rows} rows")
+        with open(os.path.join(staging_dir, MANIFEST_NAME), "w") as f:
+            json.dump({"signature": self._source_signature(), "rows": rows, "columns": stored_columns,
+                       "months": sorted(months)}, f)
+        return rows, months
+
+    def months(self) -> List[str]:
+        """Months ("YYYY-MM") present in the store, oldest first"""
+        self.ensure_converted()
+        return [month for month in self._manifest()["months"] if month != UNKNOWN_MONTH]
+
+    def read(self, columns: Optional[List[str]] = None, months: Optional[List[str]] = None,
+             filters: Optional[list] = None) -> pd.DataFrame:
+        """Load `columns` (all CSV columns by default) of `months` ("YYYY-MM", all by default).
+
+        `filters` are pyarrow predicates such as [("order_value", ">", 0)], applied
+        while reading. The partition column `month` can be selected like any other.
+        """
+        self.ensure_converted()
+        if columns is None:
+            columns = self._manifest()["columns"]
+        predicates = list(filters or [])
+        if months is not None:
+            predicates.append(("month", "in", [str(month) for month in months]))
+        categorical = [column for column in CATEGORICAL_COLUMNS if column in columns]
+        return pd.read_parquet(self.store_dir, engine="pyarrow", columns=columns, filters=predicates or None,
+                               read_dictionary=categorical or None)
+
+
+# Offline conversion: python transaction_store.py [csv ...]
+if __name__ == "__main__":
+    for path in sys.argv[1:] or [RAW_TRANSACTIONS_PATH]:
+        TransactionStore(path).convert()
@@ -0,0 +1,130 @@
+import math
+import faiss
+import numpy as np
+
+# Search-time defaults, overridable per request
+DEFAULT_NPROBE = 8  # IVF lists probed per query
+DEFAULT_EF_SEARCH = 64  # HNSW candidate list size per query
+HNSW_M = 32  # HNSW graph degree
+HNSW_EF_CONSTRUCTION = 80
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """L2-normalize embeddings so an inner product equals cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k_exact(embeddings: np.ndarray, query: np.ndarray, top_k: int, exclude=None):
+    """Exact top-k by dot product using argpartition instead of a full sort.
+
+    Rows listed in `exclude` (e.g. deleted documents) are never returned.
+    """
+    scores = embeddings @ query
+    if exclude:
+        scores[np.fromiter(exclude, dtype=np.int64, count=len(exclude))] = -np.inf
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, top_k - 1)[:top_k]
+    top = top[np.argsort(-scores[top])]
+    top = top[np.isfinite(scores[top])]
+    return scores[top], top
+
+
+def merge_results(results, top_k: int):
+    """Merge several (scores, ids) pairs into one best-first top-k"""
+    scores = np.concatenate([scores for scores, _ in results])
+    ids = np.concatenate([ids for _, ids in results])
+    order = np.argsort(-scores)[:top_k]
+    return scores[order], ids[order]
+
+
+class ExactIndex:
+    """Brute-force search over pre-normalized rows; best for small stores"""
+
+    def __init__(self, embeddings: np.ndarray):
+        self.embeddings = embeddings
+        self.size = len(embeddings)
+
+    def search(self, query: np.ndarray, top_k: int, **params):
+        return top_k_exact(self.embeddings, query, top_k)
+
+
+class FaissIndex:
+    """Base for FAISS-backed approximate indexes over pre-normalized rows"""
+
+    def __init__(self, embeddings: np.ndarray):
+        self.size = len(embeddings)
+        self.index = None
+
+    @staticmethod
+    def load(path: str) -> "FaissIndex":
+        """Restore an index written by save() without retraining it"""
+        raw = faiss.read_index(path)
+        wrapper = IVFIndex if isinstance(raw, faiss.IndexIVF) else HNSWIndex
+        index = wrapper.__new__(wrapper)
+        index.index = raw
+        index.size = raw.ntotal
+        return index
+
+    def save(self, path: str):
+        faiss.write_index(self.index, path)
+
+    def _search_params(self, nprobe=None, ef_search=None):
+        return None
+
+    def search(self, query: np.ndarray, top_k: int, nprobe=None, ef_search=None):
+        scores, ids = self.index.search(
+            query.reshape(1, -1),
+            min(top_k, self.size),
+            params=self._search_params(nprobe=nprobe, ef_search=ef_search)
+        )
+        # FAISS pads with -1 when fewer than top_k neighbours were reached
+        found = ids[0] >= 0
+        return scores[0][found], ids[0][found]
+
+
+class IVFIndex(FaissIndex):
+    """Inverted-file index; trained with k-means on the rows it is built from"""
+
+    def __init__(self, embeddings: np.ndarray, nlist: int = None):
+        super().__init__(embeddings)
+        rows, dimension = embeddings.shape
+        # ~4*sqrt(n) lists, keeping at least 39 training points per centroid
+        nlist = nlist or max(1, min(int(4 * math.sqrt(rows)), rows // 39))
+        self.quantizer = faiss.IndexFlatIP(dimension)
+        self.index = faiss.IndexIVFFlat(self.quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        self.index.train(embeddings)
+        self.index.add(embeddings)
+
+    def _search_params(self, nprobe=None, ef_search=None):
+        return faiss.SearchParametersIVF(nprobe=nprobe or DEFAULT_NPROBE)
+
+
+class HNSWIndex(FaissIndex):
+    """Graph index; no training step, higher memory than IVF"""
+
+    def __init__(self, embeddings: np.ndarray):
+        super().__init__(embeddings)
+        self.index = faiss.IndexHNSWFlat(embeddings.shape[1], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        self.index.add(embeddings)
+
+    def _search_params(self, nprobe=None, ef_search=None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or DEFAULT_EF_SEARCH)
+
+
+INDEX_TYPES = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+    "hnsw": HNSWIndex,
+}
+
+
+def build_index(embeddings: np.ndarray, kind: str = "ivf"):
+    """Build an index of the given kind over pre-normalized embeddings"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind}")
+    return INDEX_TYPES[kind](np.ascontiguousarray(embeddings, dtype=np.float32))
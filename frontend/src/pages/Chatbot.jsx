@@ -24,6 +24,7 @@ import jsConvert from 'js-convert-case';
 import { v4 as uuidV4 } from 'uuid';
 
 const BACKEND_URL = "http://localhost:8000";
+const CHAT_PAGE_SIZE = 50; // Page size of /get_all_chats and /get_all_messages; a full page means there may be more
 
 // Component
 export default function Chatbot() {
@@ -39,6 +40,8 @@ export default function Chatbot() {
   const [chatList, setChatList] = useState([]);
   const [isNewChat, setIsNewChat] = useState(false); // Add this line
   const [currentChatId, setCurrentChatId] = useState(null);
+  const [hasMoreChats, setHasMoreChats] = useState(false);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
   const [examplePrompts] = useState([
     "How do I grow my business?",
     "What are the best marketing strategies?",
@@ -61,6 +64,7 @@ export default function Chatbot() {
   const messagesEndRef = useRef(null);
   const textareaRef = useRef(null);
   const fileInputRef = useRef(null);
+  const keepScrollRef = useRef(false); // Set when older messages are prepended, so the view stays put
 
   // Effects
   useEffect(() => {
@@ -95,6 +99,10 @@ export default function Chatbot() {
   }, [merchantProfile.language]);
 
   useEffect(() => {
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     const scrollToBottom = () => {
       const navbarHeight = document.querySelector('header')?.offsetHeight || 0;
       messagesEndRef.current?.scrollIntoView({ behavior: 'smooth', block: 'start' });
@@ -104,16 +112,27 @@ export default function Chatbot() {
     scrollToBottom();
   }, [currentChatMessages, loading]);
 
-  // Get all chats from user
-  useEffect(() => {
-    fetch(BACKEND_URL + "/get_all_chats")
+  // Get the chats page by page, newest first; `before` is the last chat already listed
+  const loadChats = (before = null) => {
+    let getAllChatsAPI = new URL(BACKEND_URL + "/get_all_chats");
+    getAllChatsAPI.searchParams.append("limit", CHAT_PAGE_SIZE);
+    if (before)
+      getAllChatsAPI.searchParams.append("before", before);
+
+    fetch(getAllChatsAPI.toString())
       .then(response => response.json())
       .then(responseData => {
-        setChatList(responseData);
+        setChatList(prev => before ? [...prev, ...responseData] : responseData);
+        setHasMoreChats(responseData.length === CHAT_PAGE_SIZE);
       })
       .catch(err => {
         console.log(err);
       });
+  };
+
+  // Get all chats from user
+  useEffect(() => {
+    loadChats();
 
     return () => { };
   }, [])
@@ -167,19 +186,49 @@ export default function Chatbot() {
 
     setIsNewChat(false);
     setCurrentChatMessages([]);
+    setHasOlderMessages(false);
 
-    let getAllMessagesAPI = new URL(BACKEND_URL + "/get_all_messages");
-    getAllMessagesAPI.searchParams.append("chat_id", chatId);
-
-    fetch(getAllMessagesAPI.toString())
-      .then(response => response.json())
+    fetchMessages(chatId)
       .then(responseData => {
         setCurrentChatMessages(prev => [ ...prev, ...responseData])
+        setHasOlderMessages(responseData.length === CHAT_PAGE_SIZE);
       });
 
     setCurrentChatId(chatId);
   };
 
+  // The latest page of a chat's messages older than message `before`, oldest first
+  const fetchMessages = (chatId, before = null) => {
+    let getAllMessagesAPI = new URL(BACKEND_URL + "/get_all_messages");
+    getAllMessagesAPI.searchParams.append("chat_id", chatId);
+    getAllMessagesAPI.searchParams.append("limit", CHAT_PAGE_SIZE);
+    if (before)
+      getAllMessagesAPI.searchParams.append("before", before);
+
+    return fetch(getAllMessagesAPI.toString()).then(response => response.json());
+  };
+
+  const loadOlderMessages = () => {
+    const oldest = currentChatMessages[0];
+    if (!currentChatId || !oldest)
+      return
+
+    fetchMessages(currentChatId, oldest.id)
+      .then(responseData => {
+        // Ignore the page if another chat was opened meanwhile
+        setCurrentChatMessages(prev => {
+          if (prev[0]?.id !== oldest.id)
+            return prev;
+          keepScrollRef.current = true;
+          return [...responseData, ...prev];
+        });
+        setHasOlderMessages(responseData.length === CHAT_PAGE_SIZE);
+      })
+      .catch(err => {
+        console.log(err);
+      });
+  };
+
   // Update your handleSubmit function to reset isNewChat when saving
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -197,7 +246,8 @@ export default function Chatbot() {
     setLoading(true);
 
     try {
-      const response = await fetch(`${BACKEND_URL}/api/chat`, {
+      // Stream the answer so it renders from the first token instead of after the whole generation
+      const response = await fetch(`${BACKEND_URL}/api/chat/stream`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -212,16 +262,45 @@ export default function Chatbot() {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const responseData = await response.json();
-      const botMsg = {
-        id: uuidV4(),
-        text: responseData.response || "Sorry, I couldn't process your request.",
+      const botMsgId = uuidV4();
+      const updateBotMsg = (changes) => {
+        setCurrentChatMessages(prev => prev.map(msg => msg.id === botMsgId ? { ...msg, ...changes } : msg));
+      };
+      setCurrentChatMessages(prev => [...prev, {
+        id: botMsgId,
+        text: "",
         sender: "bot",
         timestamp: new Date(),
-        imageUrl: responseData.image_url
-      };
-
-      setCurrentChatMessages(prev => [...prev, botMsg]);
+      }]);
+
+      // Server-sent events: "token" events carry text, "done" carries the final response and image_url
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let text = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const rawEvent of events) {
+          const event = rawEvent.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(rawEvent.match(/^data: (.*)$/m)?.[1] || "{}");
+          if (event === "token") {
+            text += data.text;
+            updateBotMsg({ text });
+            setLoading(false);
+          } else if (event === "done") {
+            updateBotMsg({
+              text: data.response || "Sorry, I couldn't process your request.",
+              imageUrl: data.image_url
+            });
+          } else if (event === "error") {
+            throw new Error(data.error);
+          }
+        }
+      }
     } catch (error) {
       console.error("Error:", error);
       const errorMsg = {
@@ -392,6 +471,14 @@ export default function Chatbot() {
                   <div className="text-xs text-gray-400 mt-1">{formatDate( timestampToDate(chat.timestamp) )}</div>
                 </button>
               ))}
+              {hasMoreChats && (
+                <button
+                  onClick={() => loadChats(chatList[chatList.length - 1].id)}
+                  className="w-full p-2 text-sm text-gray-500 hover:text-gray-900 transition-colors"
+                >
+                  Load more chats
+                </button>
+              )}
             </>
           ) : (
               !isNewChat && ( // Only show "No previous chats" if there's no new chat either
@@ -445,7 +532,18 @@ export default function Chatbot() {
             {currentChatMessages.length === 0 ? (
               renderExamplePrompts()
             ) : (
-                currentChatMessages.map((msg) => (
+                <>
+                {hasOlderMessages && (
+                  <div className="mb-6 text-center">
+                    <button
+                      onClick={loadOlderMessages}
+                      className="px-3 py-1 text-sm text-gray-500 hover:text-gray-900 transition-colors"
+                    >
+                      Load older messages
+                    </button>
+                  </div>
+                )}
+                {currentChatMessages.map((msg) => (
                   <div
                     key={msg.id}
                     className={`mb-6 last:mb-0 ${msg.sender === 'bot' ? 'pr-8' : 'pl-8'
@@ -524,7 +622,8 @@ export default function Chatbot() {
                       </div>
                     </div>
                   </div>
-                ))
+                ))}
+                </>
               )}
             {loading && (
               <div className="mb-6 pr-8">